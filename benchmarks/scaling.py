@@ -0,0 +1,238 @@
+''' Scaling benchmark of iSBatch: time and peak memory (tracemalloc) of
+the sequence classes for discretizations from 10^2 to 10^5, of the
+interpolation fits for history sizes and of the LogDataCost replay for
+data sizes. Sizes predicted to exceed the time or memory budget (from the
+previous size and the complexity of the case) are skipped. The results
+are written in JSON and compared with a baseline '''
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             ".."))
+import argparse
+import json
+import platform
+import time
+import tracemalloc
+import warnings
+import numpy as np
+import iSBatch as rqs
+import iSBatchWorkload
+
+DISCRETIZATIONS = [100, 1000, 10000, 100000]
+HISTORY_SIZES = [100, 1000, 10000, 100000]
+REPLAY_SIZES = [1000, 10000, 100000, 1000000, 10000000]
+# runtime distribution of the histories (iSBatchWorkload preset)
+WORKLOAD = "lognormal"
+
+
+def get_cdf(size, seed=0):
+    ''' Discrete CDF of size distinct values drawn from the workload '''
+    runtimes = np.unique(iSBatchWorkload.WorkloadGenerator(seed).get_runtimes(
+        2 * size, WORKLOAD))
+    assert (len(runtimes) >= size), "Not enough distinct runtimes"
+    rng = np.random.default_rng(seed)
+    values = np.sort(rng.choice(runtimes, size, replace=False))
+    return values, np.arange(1, size + 1) / size
+
+
+def get_history(size, seed=0):
+    return iSBatchWorkload.WorkloadGenerator(seed).get_runtimes(
+        size, WORKLOAD, resolution=0.1)
+
+
+def sequence_case(sequence_type, params):
+    def run(size):
+        values, cdf = get_cdf(size)
+        cost = rqs.ClusterCosts(1, 1, 0)
+        sequence_type(values, cdf, cost, params=params)\
+            .compute_request_sequence()
+    return run
+
+
+def fit_case(model):
+    def run(size):
+        wl = rqs.ResourceEstimator(get_history(size))
+        data, cdf = wl._get_cdf()
+        model().get_best_fit(data, cdf)
+    return run
+
+
+def replay_case(size):
+    data = get_history(size)
+    sequence = list(np.quantile(data, np.linspace(0.3, 1, 20)))
+    rqs.LogDataCost(sequence).compute_cost(data, rqs.ClusterCosts(1, 1, 0))
+
+
+# (suite, name, function, sizes, time exponent, memory exponent)
+CASES = [
+    ("sequence", "RequestSequence",
+     sequence_case(rqs.RequestSequence, [0]), DISCRETIZATIONS, 1, 1),
+    ("sequence", "CheckpointSequence",
+     sequence_case(rqs.CheckpointSequence, [0]), DISCRETIZATIONS, 3, 2),
+    ("sequence", "AllCheckpointSequence",
+     sequence_case(rqs.AllCheckpointSequence, [0]), DISCRETIZATIONS, 2, 1),
+    ("sequence", "LimitedSequence:ThresholdBased",
+     sequence_case(rqs.LimitedSequence, [
+         rqs.CRStrategy.AlwaysCheckpoint, rqs.LimitStrategy.ThresholdBased,
+         3, 0]), DISCRETIZATIONS, 2, 1),
+    ("sequence", "LimitedSequence:AverageBased",
+     sequence_case(rqs.LimitedSequence, [
+         rqs.CRStrategy.AlwaysCheckpoint, rqs.LimitStrategy.AverageBased,
+         3, 0]), DISCRETIZATIONS, 3, 2),
+    ("fit", "PolyInterpolation",
+     fit_case(rqs.PolyInterpolation), HISTORY_SIZES, 1, 1),
+    ("fit", "FunctionInterpolation:log",
+     fit_case(lambda: rqs.FunctionInterpolation(np.log)), HISTORY_SIZES,
+     1, 1),
+    ("fit", "DistInterpolation",
+     fit_case(rqs.DistInterpolation), HISTORY_SIZES, 1, 1),
+    ("replay", "LogDataCost", replay_case, REPLAY_SIZES, 1, 1),
+]
+
+
+def measure(function, size, repeat):
+    ''' Best wall time over repeat runs and the peak memory of one run
+    traced separately (tracemalloc slows down the run) '''
+    seconds = np.inf
+    for i in range(repeat):
+        start = time.perf_counter()
+        function(size)
+        seconds = min(seconds, time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        function(size)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return seconds, peak
+
+
+def run_cases(cases, max_seconds, max_memory, repeat, max_size=None):
+    results = []
+    for suite, name, function, sizes, time_exp, memory_exp in cases:
+        previous = None
+        for size in sizes:
+            entry = {"suite": suite, "case": name, "size": size}
+            if max_size is not None and size > max_size:
+                continue
+            if previous is not None:
+                ratio = size / previous[0]
+                predicted_time = previous[1] * ratio ** time_exp
+                predicted_memory = previous[2] * ratio ** memory_exp
+                if predicted_time > max_seconds or \
+                   predicted_memory > max_memory:
+                    entry["skipped"] = "predicted %.1fs %.1fMB" % (
+                        predicted_time, predicted_memory / 2**20)
+                    results.append(entry)
+                    print("%-8s %-32s %8d skipped (%s)" % (
+                        suite, name, size, entry["skipped"]))
+                    previous = None
+                    continue
+            elif len(results) > 0 and results[-1]["case"] == name and \
+                    "skipped" in results[-1]:
+                # the larger sizes are skipped too
+                entry["skipped"] = "smaller size skipped"
+                results.append(entry)
+                continue
+            seconds, peak = measure(function, size, repeat)
+            entry["seconds"] = seconds
+            entry["peak_bytes"] = peak
+            results.append(entry)
+            previous = (size, seconds, peak)
+            print("%-8s %-32s %8d %10.4fs %10.2fMB" % (
+                suite, name, size, seconds, peak / 2**20))
+    return results
+
+
+def compare(results, baseline, time_threshold, memory_threshold,
+            min_seconds=0.05):
+    ''' Returns the regressions (entries slower or using more memory than
+    the baseline by more than the thresholds) and the entries measured
+    that are not in the baseline. Times below min_seconds are too noisy
+    to be compared '''
+    reference = {(i["suite"], i["case"], i["size"]): i
+                 for i in baseline["results"] if "skipped" not in i}
+    regressions = []
+    missing = []
+    for entry in results:
+        if "skipped" in entry:
+            continue
+        base = reference.get((entry["suite"], entry["case"], entry["size"]))
+        if base is None:
+            missing.append(entry)
+            continue
+        if max(entry["seconds"], base["seconds"]) >= min_seconds and \
+           entry["seconds"] > base["seconds"] * (1 + time_threshold):
+            regressions.append((entry, "time", base["seconds"],
+                                entry["seconds"]))
+        if entry["peak_bytes"] > base["peak_bytes"] * (1 + memory_threshold):
+            regressions.append((entry, "memory", base["peak_bytes"],
+                                entry["peak_bytes"]))
+    return regressions, missing
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--output", default="scaling.json",
+                        help="JSON file for the results")
+    parser.add_argument("--baseline", default=None,
+                        help="JSON results to compare with")
+    parser.add_argument("--time-threshold", type=float, default=0.25,
+                        help="allowed relative slowdown (default 25%%)")
+    parser.add_argument("--memory-threshold", type=float, default=0.10,
+                        help="allowed relative memory increase")
+    parser.add_argument("--min-seconds", type=float, default=0.05,
+                        help="shorter times are not compared (noise)")
+    parser.add_argument("--max-seconds", type=float, default=30,
+                        help="time budget of one run")
+    parser.add_argument("--max-memory", type=float, default=2048,
+                        help="memory budget of one run (MB)")
+    parser.add_argument("--max-size", type=int, default=None,
+                        help="largest size measured (e.g. 1000 for a "
+                        "quick run)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--workload", default=WORKLOAD,
+                        choices=sorted(iSBatchWorkload.PRESETS),
+                        help="distribution of the histories")
+    parser.add_argument("-k", dest="filter", default=None,
+                        help="only the cases containing this string")
+    args = parser.parse_args()
+
+    warnings.simplefilter("ignore")
+    WORKLOAD = args.workload
+    baseline = None
+    if args.baseline is not None:
+        with open(args.baseline) as fp:
+            baseline = json.load(fp)
+        # the times depend on the distribution of the histories
+        if baseline["meta"].get("workload") != WORKLOAD:
+            parser.error("%s was measured on the %s workload, not %s" % (
+                args.baseline, baseline["meta"].get("workload"), WORKLOAD))
+    cases = [case for case in CASES if args.filter is None or
+             args.filter in "%s:%s" % (case[0], case[1])]
+    results = run_cases(cases, args.max_seconds, args.max_memory * 2**20,
+                        args.repeat, max_size=args.max_size)
+    output = {"meta": {"python": platform.python_version(),
+                       "numpy": np.__version__,
+                       "machine": platform.machine(),
+                       "workload": WORKLOAD,
+                       "date": time.strftime("%Y-%m-%d %H:%M:%S")},
+              "results": results}
+    with open(args.output, "w") as fp:
+        json.dump(output, fp, indent=1)
+
+    if baseline is not None:
+        regressions, missing = compare(results, baseline,
+                                       args.time_threshold,
+                                       args.memory_threshold,
+                                       args.min_seconds)
+        for entry in missing:
+            print("Not in the baseline %s %s %d" % (
+                entry["suite"], entry["case"], entry["size"]))
+        for entry, kind, base, new in regressions:
+            print("Regression %s %s %d %s: %g -> %g" % (
+                entry["suite"], entry["case"], entry["size"], kind,
+                base, new))
+        if len(regressions) > 0:
+            sys.exit(1)
+        print("No regression compared to %s" % (args.baseline))
@@ -1,17 +1,18 @@
 import sys
 sys.path.append("..")
 import iSBatch as rqs
+import iSBatchLoader
 import numpy as np
 
 if __name__ == '__main__':
     if len(sys.argv) < 3:
-        print("Usage: %s log_file training_size" %(sys.argv[0]))
+        print("Usage: %s log_file training_size [resamples]" %(sys.argv[0]))
         exit()
 
     file_name = sys.argv[1]
     train_size = int(sys.argv[2])
 
-    data = np.loadtxt(file_name, delimiter=' ')
+    data = iSBatchLoader.load_log(file_name)
     assert (len(data) > train_size), "Training size exceeds the total dataset"
     training = list(data[:train_size]) + [max(data)]
 
@@ -20,7 +21,7 @@ if __name__ == '__main__':
     cl = rqs.ClusterCosts(1, 0, 0)
     sequence = wl.compute_request_sequence(cluster_cost=cl)
     # cost value will be used as reference as optimal
-    cost_opt = wl.compute_sequence_cost(sequence, data, cluster_cost=cl)
+    cost_opt, _ = wl.compute_sequence_cost(sequence, data, cluster_cost=cl)
 
     print("Request sequence based on the entire dataset: %s Cost %.2f" % (
         sequence, cost_opt))
@@ -28,8 +29,18 @@ if __name__ == '__main__':
     # compute the requests based on the training data
     wl = rqs.ResourceEstimator(training)
     sequence = wl.compute_request_sequence(cluster_cost=cl)
-    cost = wl.compute_sequence_cost(sequence, data, cluster_cost=cl)
+    cost, _ = wl.compute_sequence_cost(sequence, data, cluster_cost=cl)
 
     print("Request sequence based on training: %s\n"\
           "Sequence cost: %.2f (within %.2f%% of optimal)" % (
               sequence, cost, (cost-cost_opt)*100/cost_opt))
+
+    if len(sys.argv) > 3:
+        # confidence interval over bootstrap resamples of the training
+        evaluator = rqs.BootstrapEvaluator(cluster_cost=cl,
+                                           resamples=int(sys.argv[3]))
+        result = evaluator.evaluate(data[:train_size], data)
+        print("Bootstrap cost ratio over %d resamples: %.3f "\
+              "(95%% interval %.3f - %.3f)" % (
+                  len(result["ratios"]), result["mean"],
+                  result["interval"][0], result["interval"][1]))
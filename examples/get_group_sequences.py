@@ -0,0 +1,18 @@
+import sys
+sys.path.append("..")
+import iSBatchLoader
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        print("Usage: %s sacct_csv_file output_file [min_history]"
+              %(sys.argv[0]))
+        exit()
+
+    min_history = 10
+    if len(sys.argv) > 3:
+        min_history = int(sys.argv[3])
+    ingestion = iSBatchLoader.AccountingLogIngestion(
+        min_history=min_history)
+    rows = ingestion.run(sys.argv[1], sys.argv[2])
+    print("Sequences computed for %d groups (%d skipped, %d failed)"
+          %(len(rows), len(ingestion.skipped), len(ingestion.errors)))
@@ -1,6 +1,7 @@
 import sys
 sys.path.append("..")
 import iSBatch as rqs
+import iSBatchLoader
 import numpy as np
 
 if __name__ == '__main__':
@@ -15,7 +16,7 @@ if __name__ == '__main__':
     if len(sys.argv) > 3:
         strategy = rqs.LimitStrategy.AverageBased
 
-    history = np.loadtxt(file_name, delimiter=' ')
+    history = iSBatchLoader.load_log(file_name)
     params = rqs.ResourceParameters()
     params.submissions_limit = limit
     params.submissions_limit_strategy = strategy 
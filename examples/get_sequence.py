@@ -1,6 +1,7 @@
 import sys
 sys.path.append("..")
 import iSBatch as rqs
+import iSBatchLoader
 import numpy as np
 
 if __name__ == '__main__':
@@ -9,7 +10,7 @@ if __name__ == '__main__':
         exit()
 
     file_name = sys.argv[1]
-    history = np.loadtxt(file_name, delimiter=' ')
+    history = iSBatchLoader.load_log(file_name)
     params = rqs.ResourceParameters()
     params.CR_strategy = rqs.CRStrategy.NeverCheckpoint
     wl = rqs.ResourceEstimator(history, params=params)
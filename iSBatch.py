@@ -3,11 +3,22 @@ import warnings
 import scipy.integrate as integrate
 import scipy.stats as st
 from scipy.optimize import curve_fit
-from collections import Counter
 import sys
 from enum import IntEnum
 import warnings
 import itertools
+import signal
+import threading
+import asyncio
+import os
+import json
+import hashlib
+import tempfile
+import bisect
+import time
+import contextlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
 
 class CRStrategy(IntEnum):
     ''' Enumeration class to hold the types of Checkpoint/Restart
@@ -39,6 +50,12 @@ class StaticCheckpointMemoryModel():
     def get_restart_time(self, ts):
         return self.R
 
+    def get_checkpoint_times(self, ts):
+        return np.full(len(ts), self.C, dtype=float)
+
+    def get_restart_times(self, ts):
+        return np.full(len(ts), self.R, dtype=float)
+
 
 class DynamicCheckpointMemoryModel():
     ''' Dynamic checkpoint model, defined by read/write bandwidths and Csize,
@@ -61,12 +78,18 @@ class DynamicCheckpointMemoryModel():
         assert(all(self.size[i][0] < self.size[i + 1][0] for i in range(
             len(self.size)-1))), "Incorrect ts in the checkpoint size sequence"
         assert(all(i[1] > 0 for i in self.size)), "Negative checkpoint size"
+        self._ts = np.array([i[0] for i in self.size], dtype=float)
+        self._sizes = np.array([i[1] for i in self.size], dtype=float)
 
     def __get_size(self, ts):
         # find the last entry in the checkpoint_size list
-        # that has the timestamp < the given ts
-        C = next((i for i in reversed(self.size) if i[0] <= ts), None)
-        return C[1]
+        # that has the timestamp <= the given ts
+        return self.size[bisect.bisect_right(self._ts, ts) - 1][1]
+
+    def __get_sizes(self, ts):
+        # vectorized __get_size for an array of timestamps
+        idx = np.searchsorted(self._ts, ts, side='right') - 1
+        return self._sizes[idx]
 
     def get_checkpoint_time(self, ts):
         size = self.__get_size(ts)
@@ -76,6 +99,106 @@ class DynamicCheckpointMemoryModel():
         size = self.__get_size(ts)
         return self.rbw * size
 
+    def get_checkpoint_times(self, ts):
+        return self.wbw * self.__get_sizes(ts)
+
+    def get_restart_times(self, ts):
+        return self.rbw * self.__get_sizes(ts)
+
+
+class MemoryTraceBuilder():
+    ''' Builds the (ts, size) segments of a DynamicCheckpointMemoryModel
+    from the memory traces of past runs. Each trace (ts, size) is read in
+    chunks of chunk_size samples (text files line by line, .npy files
+    memory mapped) and merged in the elementwise max envelope of all the
+    traces, so only the envelope is kept in memory. Consecutive samples
+    that differ by less than threshold are grouped in one segment and the
+    sizes are multiplied by scale (default KB to MB) '''
+
+    def __init__(self, threshold=204800, scale=1 / 1024, chunk_size=65536):
+        assert (chunk_size > 0), "Invalid chunk size"
+        self.threshold = threshold
+        self.scale = scale
+        self.chunk_size = chunk_size
+        self._envelope = np.zeros((0, 2))
+        self._length = 0
+        self.traces = 0
+
+    def __merge_chunk(self, chunk, offset):
+        end = offset + len(chunk)
+        if end > len(self._envelope):
+            # grow geometrically, the padding is 0 like for shorter traces
+            envelope = np.zeros((max(end, 2 * len(self._envelope)), 2))
+            envelope[:self._length] = self._envelope[:self._length]
+            self._envelope = envelope
+        np.maximum(self._envelope[offset:end], chunk,
+                   out=self._envelope[offset:end])
+        self._length = max(self._length, end)
+        return end
+
+    def add_trace(self, trace):
+        ''' Merge an array (or memory mapped array) of (ts, size) '''
+        offset = 0
+        for start in range(0, len(trace), self.chunk_size):
+            chunk = np.asarray(trace[start:start + self.chunk_size],
+                               dtype=float).reshape(-1, 2)
+            offset = self.__merge_chunk(chunk, offset)
+        self.traces += 1
+
+    def add_file(self, file_name, delimiter=','):
+        ''' Merge a trace file, either text (one ts, size pair per line)
+        or a .npy file that is memory mapped '''
+        if file_name.endswith('.npy'):
+            self.add_trace(np.load(file_name, mmap_mode='r'))
+            return
+        offset = 0
+        with open(file_name) as f:
+            while True:
+                lines = list(itertools.islice(f, self.chunk_size))
+                if len(lines) == 0:
+                    break
+                chunk = np.loadtxt(lines, delimiter=delimiter, ndmin=2)
+                if len(chunk) > 0:
+                    offset = self.__merge_chunk(chunk, offset)
+        self.traces += 1
+
+    def get_envelope(self):
+        return self._envelope[:self._length]
+
+    def get_segments(self):
+        ''' Group the envelope in (ts, size) segments. The change points
+        (jumps larger than the threshold) are found at once, consecutive
+        parts with a mean size close to the previous segment are merged '''
+        envelope = self.get_envelope()
+        assert (len(envelope) > 0), "No memory trace was added"
+        sizes = envelope[:, 1]
+        change = np.flatnonzero(
+            np.abs(np.diff(sizes)) > self.threshold) + 1
+        bounds = np.concatenate(([0], change))
+        part_sum = np.add.reduceat(sizes, bounds)
+        part_count = np.diff(np.append(bounds, len(sizes)))
+
+        segments = []
+        ts, total, count = 0, 0, 0
+        for i in range(len(bounds)):
+            if i > 0 and count > 0 and (len(segments) == 0 or abs(
+                    total / count - segments[-1][1]) > self.threshold):
+                segments.append((ts, total / count))
+                ts = envelope[bounds[i], 0]
+                total, count = 0, 0
+            total += part_sum[i]
+            count += part_count[i]
+        # the last part is kept if it differs from the last segment
+        if len(segments) == 0 or abs(
+                total / count - segments[-1][1]) > self.threshold:
+            segments.append((ts, total / count))
+        return [(float(i[0]), float(i[1] * self.scale)) for i in segments]
+
+    def build(self, write_bandwidth=1, read_bandwidth=1):
+        return DynamicCheckpointMemoryModel(
+            self.get_segments(), write_bandwidth=write_bandwidth,
+            read_bandwidth=read_bandwidth)
+
 
 class ClusterCosts():
     ''' Class for storing the costs of running on the cluster
@@ -99,6 +222,150 @@ class ClusterCosts():
     def get_restart_time(self, ts):
         return self.checkpoint_memory_model.get_restart_time(ts)
 
+    # models with only the scalar methods are evaluated at each ts
+    def get_checkpoint_times(self, ts):
+        model = self.checkpoint_memory_model
+        if not hasattr(model, "get_checkpoint_times"):
+            return np.array([model.get_checkpoint_time(t) for t in ts],
+                            dtype=float)
+        return model.get_checkpoint_times(ts)
+
+    def get_restart_times(self, ts):
+        model = self.checkpoint_memory_model
+        if not hasattr(model, "get_restart_times"):
+            return np.array([model.get_restart_time(t) for t in ts],
+                            dtype=float)
+        return model.get_restart_times(ts)
+
+
+class QuantileSketch():
+    ''' Mergeable quantile sketch (t-digest style) holding at most size
+    weighted centroids, with a finer resolution at the tails. With decay
+    < 1 the weight of every run is multiplied by decay for each newer run
+    so the sketch follows the recent behavior of the application '''
+
+    def __init__(self, size=200, decay=1):
+        assert (size > 2), "The sketch needs at least 3 centroids"
+        assert (0 < decay <= 1), "The decay needs to be in (0, 1]"
+        self.size = size
+        self.decay = decay
+        self.count = 0
+        self.min = np.inf
+        self.max = -np.inf
+        self._means = np.zeros(0)
+        self._weights = np.zeros(0)
+
+    def __compress(self, means, weights):
+        order = np.argsort(means, kind='stable')
+        means = means[order]
+        weights = weights[order]
+        # the centroids are grouped by the arcsin scale of their quantile
+        q = (np.cumsum(weights) - weights / 2) / np.sum(weights)
+        k = self.size * (np.arcsin(2 * q - 1) / np.pi + 0.5)
+        group = np.minimum(k.astype(int), self.size - 1)
+        total = np.bincount(group, weights=weights)
+        keep = total > 0
+        self._means = np.bincount(group, weights=weights * means)[keep] / \
+            total[keep]
+        self._weights = total[keep]
+
+    def add(self, values, weights=None):
+        values = np.asarray(values, dtype=float).ravel()
+        if len(values) == 0:
+            return
+        if weights is None:
+            weights = np.ones(len(values))
+        weights = np.asarray(weights, dtype=float).ravel()
+        assert (len(weights) == len(values)), "One weight needed per run"
+        old_weights = self._weights
+        if self.decay < 1:
+            old_weights = old_weights * self.decay ** len(values)
+            weights = weights * self.decay ** np.arange(
+                len(values) - 1, -1, -1)
+        self.__compress(np.concatenate((self._means, values)),
+                        np.concatenate((old_weights, weights)))
+        self.count += len(values)
+        self.min = min(self.min, np.min(values))
+        self.max = max(self.max, np.max(values))
+
+    def merge(self, sketch):
+        self.__compress(np.concatenate((self._means, sketch._means)),
+                        np.concatenate((self._weights, sketch._weights)))
+        self.count += sketch.count
+        self.min = min(self.min, sketch.min)
+        self.max = max(self.max, sketch.max)
+
+    def get_values(self):
+        # centroids together with the exact smallest and largest runs
+        return np.unique(np.concatenate(([self.min], self._means,
+                                         [self.max])))
+
+    def get_discrete_cdf(self, points):
+        ''' Returns the (discrete_data, cdf) at points equally spaced
+        quantiles, each value is the upper limit of its quantile so the
+        largest run has a cdf of 1 '''
+        assert (self.count > 0), "The sketch is empty"
+        total = np.sum(self._weights)
+        mid = (np.cumsum(self._weights) - self._weights / 2) / total
+        levels = np.arange(1, points + 1) / points
+        values = np.interp(levels, np.concatenate(([0], mid, [1])),
+                           np.concatenate(([self.min], self._means,
+                                           [self.max])))
+        keep = np.append(np.diff(values) > 0, True)
+        return values[keep], levels[keep]
+
+
+class EstimatorStats():
+    ''' Opt-in instrumentation of the ResourceEstimator (given in
+    ResourceParameters.instrumentation). Records the wall time and number
+    of calls of every stage, counters (DP states, fit attempts and
+    failures) and values (E table size in bytes, best model). The hook is
+    called with (kind, name, value) for every record, kind being "time",
+    "counter" or "value", to forward the stats to a metrics pipeline '''
+
+    def __init__(self, hook=None):
+        self.hook = hook
+        self.reset()
+
+    def reset(self):
+        self.times = {}
+        self.calls = {}
+        self.counters = {}
+        self.values = {}
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name, seconds):
+        self.times[name] = self.times.get(name, 0) + seconds
+        self.calls[name] = self.calls.get(name, 0) + 1
+        if self.hook is not None:
+            self.hook("time", name, seconds)
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+        if self.hook is not None:
+            self.hook("counter", name, value)
+
+    def set(self, name, value):
+        self.values[name] = value
+        if self.hook is not None:
+            self.hook("value", name, value)
+
+    def to_dict(self):
+        return {"times": dict(self.times), "calls": dict(self.calls),
+                "counters": dict(self.counters),
+                "values": dict(self.values)}
+
+
+# stage used when the instrumentation is disabled
+_no_stage = contextlib.nullcontext()
+
 
 class ResourceParameters():
     interpolation_model = None
@@ -110,21 +377,46 @@ class ResourceParameters():
     request_increment_limit = 0
     submissions_limit = None
     submissions_limit_strategy = LimitStrategy.ThresholdBased
+    # processes used by DistInterpolation to fit the distributions and
+    # the time limit (in seconds) for fitting one distribution
+    fitting_workers = None
+    fitting_timeout = None
+    # FitCache used to share the best fits between estimators
+    fit_cache = None
+    # size of the coarse grid used by the MultiResolutionSolver for the
+    # checkpoint and limited sequences (None uses the full discretization)
+    multiresolution_grid = None
+    # number of centroids of the QuantileSketch replacing the history (None
+    # keeps all the runs) and the decay of the weight of older runs
+    quantile_sketch = None
+    quantile_decay = 1
+    # weight the interpolation fits with the mass of each discrete value
+    weighted_fit = False
+    # EstimatorStats recording the time of each stage (None disables it)
+    instrumentation = None
 
 class ResourceEstimator():
     ''' Class used to generate the sequence of resource requests
-        needed to be used for application submissions '''
+        needed to be used for application submissions. The past runs can
+        be given as an histogram: the distinct values in past_runs and the
+        number of runs (or the weight) of each value in weights '''
 
-    def __init__(self, past_runs, params=ResourceParameters()):
+    def __init__(self, past_runs, params=ResourceParameters(), weights=None):
         # Set all initial data
         self.params = params
+        self.stats = params.instrumentation
         self.fit_model = None
         self.discrete_data = None
         self.default_interpolation = True
         self.discretization = -1
         self.adjust_discrete_data = False
         assert (len(past_runs) > 0), "Invalid log provided"
-        self.__set_workload(past_runs)
+        # in sketch mode only the sketch of the runs is kept
+        self.sketch = None
+        if params.quantile_sketch is not None:
+            self.sketch = QuantileSketch(params.quantile_sketch,
+                                         decay=params.quantile_decay)
+        self.__set_workload(past_runs, weights)
 
         if params.resource_discretization > 0:
             assert(params.resource_discretization > 2), \
@@ -135,20 +427,59 @@ class ResourceEstimator():
         if params.interpolation_model is not None:
             self.set_interpolation_model(params.interpolation_model)
             self.default_interpolation = False
-        elif len(past_runs) < 100:
+        elif self.__get_run_count(past_runs, weights) < 100:
             if self.discretization == -1:
                 self.discretization = 500
             self.set_interpolation_model(
-                DistInterpolation(discretization=self.discretization))
+                DistInterpolation(discretization=self.discretization,
+                                  workers=params.fitting_workers,
+                                  timeout=params.fitting_timeout))
 
+        if self.sketch is not None:
+            # the sketch gives the cdf directly at the discretization
+            self.adjust_discrete_data = False
+            if self.discretization == -1:
+                self.discretization = self.sketch.size
         if self.discretization == -1:
-            self.discretization = len(set(past_runs))
+            self.discretization = len(np.unique(self.data))
+
+        # sequence updated by add_runs and the last cluster costs used
+        self._incremental = None
+        self._last_cluster_cost = None
+        self._multiresolution_report = None
+        # buffers of the runs (and weights) appended by add_runs
+        self._buffers = {}
 
     ''' Private functions '''
 
-    def __set_workload(self, past_runs):
-        self.data = past_runs
+    def __set_workload(self, past_runs, weights=None):
         self.best_fit = None
+        self.weights = None
+        if self.sketch is not None:
+            self.sketch.add(past_runs, weights)
+            self.data = self.sketch.get_values()
+            return
+        # contiguous arrays are used as they are (no copy)
+        self.data = np.ascontiguousarray(past_runs)
+        if weights is not None:
+            self.weights = np.ascontiguousarray(weights, dtype=float)
+            assert (self.weights.shape == self.data.shape), \
+                "One weight needed for each past run"
+            assert (np.all(self.weights >= 0)), "Negative weights"
+
+    def __get_run_count(self, past_runs, weights):
+        if weights is None:
+            return len(past_runs)
+        return np.sum(weights)
+
+    def __get_counts(self):
+        ''' Distinct values in the history and their number of runs '''
+        if self.weights is None:
+            return np.unique(self.data, return_counts=True)
+        values, inverse = np.unique(self.data, return_inverse=True)
+        counts = np.bincount(inverse.ravel(), weights=self.weights.ravel())
+        # values with a weight of 0 are not part of the history
+        return values[counts > 0], counts[counts > 0]
 
     def __adjust_discrete_data(self, discrete_data, cdf):
         ''' Adjust the discrete_data / cdf according to the discretization '''
@@ -159,46 +490,56 @@ class ResourceEstimator():
         if self.discretization < len(cdf):
             idx = np.random.choice(np.arange(len(cdf)),
                                    self.discretization)
-            newdata = [discrete_data[i] for i in idx]
-            newcdf = [cdf[i] for i in idx]
+            newdata = discrete_data[idx]
+            newcdf = cdf[idx]
             # the largest value needs to be included in the selected data
-            if discrete_data[-1] not in newdata:
+            if not np.any(newdata == discrete_data[-1]):
                 newdata[-1] = discrete_data[-1]
                 newcdf[-1] = cdf[-1]
 
         if self.discretization > len(cdf):
             idx = np.random.choice(np.arange(len(cdf) - 1),
                                    abs(self.discretization - len(cdf)))
-            add_elements = Counter(idx)  # where add_elements[idx]=count
-            newdata = discrete_data
-            newcdf = cdf
-            for idx in add_elements:
-                step = (discrete_data[idx + 1] - discrete_data[idx]) /\
-                       (add_elements[idx] + 1)
-                newdata += [discrete_data[idx] + i * step
-                            for i in range(add_elements[idx])]
-                step = (cdf[idx + 1] - cdf[idx]) / (add_elements[idx] + 1)
-                newcdf += [cdf[idx] + i * step
-                           for i in range(add_elements[idx])]
-
-        newdata = [x for _, x in sorted(zip(newcdf, newdata))]
-        newcdf.sort()
-        return (newdata, newcdf)
+            # add_elements[i] points between idx[i] and idx[i] + 1
+            idx, add_elements = np.unique(idx, return_counts=True)
+            pos = np.repeat(idx, add_elements)
+            # position of each new point inside its interval
+            i = np.arange(len(pos)) - np.repeat(
+                np.cumsum(add_elements) - add_elements, add_elements)
+            count = np.repeat(add_elements, add_elements) + 1
+            step = (discrete_data[pos + 1] - discrete_data[pos]) / count
+            newdata = np.concatenate((discrete_data,
+                                      discrete_data[pos] + i * step))
+            step = (cdf[pos + 1] - cdf[pos]) / count
+            newcdf = np.concatenate((cdf, cdf[pos] + i * step))
+
+        order = np.lexsort((newdata, newcdf))
+        return (newdata[order], newcdf[order])
+
+    def __stage(self, name):
+        if self.stats is None:
+            return _no_stage
+        return self.stats.stage(name)
 
     def __compute_discrete_cdf(self):
+        with self.__stage("discrete_cdf"):
+            return self.__build_discrete_cdf()
+
+    def __build_discrete_cdf(self):
         assert (self.data is not None),\
             'Data needs to be set to compute the discrete CDF'
 
-        discrete_data = list(Counter(self.data).keys())
-        cdf = list(Counter(self.data).values())
-        cdf = [x for _, x in sorted(zip(discrete_data, cdf))]
-        discrete_data.sort()
-        cdf = [i * 1. / len(cdf) for i in cdf]
-        for i in range(1, len(cdf)):
-            cdf[i] += cdf[i-1]
+        if self.sketch is not None:
+            discrete_data, cdf = self.sketch.get_discrete_cdf(
+                self.discretization)
+            self.discrete_data = discrete_data
+            self.cdf = cdf
+            return discrete_data, cdf
+
+        discrete_data, counts = self.__get_counts()
+        cdf = np.cumsum(counts)
         # normalize the cdf
-        for i in range(len(cdf)):
-            cdf[i] /= cdf[-1]
+        cdf = cdf / cdf[-1]
 
         # adjust the discrete data accordin to the discretization
         if self.adjust_discrete_data:
@@ -212,22 +553,89 @@ class ResourceEstimator():
     def __compute_best_fit(self):
         if self.fit_model is None:
             return -1
+        with self.__stage("best_fit"):
+            best_i = self.__find_best_fit()
+        if self.stats is not None:
+            self.stats.set("best_model",
+                           self.__describe_fit(best_i, self.best_fit))
+        return best_i
+
+    def __record_fit(self, model, fit):
+        # fit attempts, failures and time of each distribution
+        if isinstance(model, DistInterpolation):
+            for name, seconds, success in model.fit_times:
+                self.stats.add_time("fit:" + name, seconds)
+                self.stats.count("fit_attempts")
+                if not success:
+                    self.stats.count("fit_failures")
+            return
+        self.stats.count("fit_attempts")
+        if fit[2] == np.inf:
+            self.stats.count("fit_failures")
+
+    def __find_best_fit(self):
+
+        key = None
+        if self.params.fit_cache is not None:
+            key = self.__get_fit_cache_key()
+            if self.__load_cached_fit(key):
+                return self.best_fit_index
 
         # set dicrete data and cdf to the original ones
         ddata, dcdf = self.__compute_discrete_cdf()
 
+        weights = None
+        if self.params.weighted_fit:
+            # mass of each discrete value
+            weights = np.diff(dcdf, prepend=0)
         best_fit = self.fit_model[0].get_empty_fit()
         best_i = -1
         for i in range(len(self.fit_model)):
             fit = self.fit_model[i].get_best_fit(
-                ddata, dcdf)
+                ddata, dcdf, weights=weights)
+            if self.stats is not None:
+                self.__record_fit(self.fit_model[i], fit)
             if fit[2] < best_fit[2]:
                 best_fit = fit
                 best_i = i
         self.best_fit = best_fit
         self.best_fit_index = best_i
+        # failed fits are not cached, they may come from the time limit
+        if key is not None and best_i >= 0:
+            self.params.fit_cache.put(key, {
+                "model": best_i,
+                "fit": self.fit_model[best_i].encode_fit(best_fit)})
         return best_i
 
+    def __describe_fit(self, index, fit):
+        if index < 0:
+            return None
+        description = self.fit_model[index].describe()
+        if isinstance(self.fit_model[index], DistInterpolation):
+            description = [description[0], fit[0].name]
+        return description
+
+    def __get_fit_cache_key(self):
+        # the key uses the CDF before adjusting it to the discretization
+        # since the adjustment is random
+        adjust = self.adjust_discrete_data
+        self.adjust_discrete_data = False
+        ddata, dcdf = self.__compute_discrete_cdf()
+        self.adjust_discrete_data = adjust
+        return FitCache.fingerprint(
+            ddata, dcdf, [model.describe() for model in self.fit_model] +
+            [self.discretization if adjust else -1,
+             self.params.weighted_fit])
+
+    def __load_cached_fit(self, key):
+        entry = self.params.fit_cache.get(key)
+        if entry is None:
+            return False
+        model = self.fit_model[entry["model"]]
+        self.best_fit = model.decode_fit(entry["fit"])
+        self.best_fit_index = entry["model"]
+        return True
+
     def __get_limits(self):
         limits = []
         warnings.simplefilter("error", category=RuntimeWarning)
@@ -243,7 +651,7 @@ class ResourceEstimator():
             # if only the upper limit is set
             if len(limits) == 0:
                 # add the min data as the lower limit
-                limits.append(min(self.data))
+                limits.append(np.min(self.data))
             limits.append(self.params.request_upper_limit)
         return limits
 
@@ -251,8 +659,12 @@ class ResourceEstimator():
         if self.best_fit is None:
             self.__compute_best_fit()
         limits = self.__get_limits()
-        self.discrete_data, self.cdf = self.fit_model[
-            self.best_fit_index].get_discrete_cdf(all_data, self.best_fit)
+        with self.__stage("interpolation_cdf"):
+            discrete_data, cdf = self.fit_model[
+                self.best_fit_index].get_discrete_cdf(all_data,
+                                                      self.best_fit)
+        self.discrete_data = np.asarray(discrete_data)
+        self.cdf = np.asarray(cdf, dtype=float)
         return self.discrete_data, self.cdf
 
     def __get_sequence_type(self):
@@ -273,20 +685,31 @@ class ResourceEstimator():
         # by default return request times when checkpoint is not availabe
         return RequestSequence, (self.params.request_increment_limit, )
 
-    def __trim_according_to_limits(self, data=[], cdf=[]):
-        if len(data) == 0:
+    def __is_incremental(self, cluster_cost):
+        # the E table can be updated only if it is computed on the discrete
+        # CDF of all runs with the lower envelope of RequestSequence
+        return self.fit_model is None and not self.adjust_discrete_data \
+            and self.sketch is None \
+            and self.params.request_upper_limit is None \
+            and self.params.request_lower_limit is None \
+            and self.params.submissions_limit is None \
+            and self.params.CR_strategy == CRStrategy.NeverCheckpoint \
+            and self.params.request_increment_limit <= 0 \
+            and cluster_cost.alpha >= 0
+
+    def __trim_according_to_limits(self, data=None, cdf=None):
+        if data is None:
             data = self.discrete_data
             cdf = self.cdf
-        idx = range(len(data))
+        if self.params.request_upper_limit is None and \
+           self.params.request_lower_limit is None:
+            return data, cdf
+        mask = np.ones(len(data), dtype=bool)
         if self.params.request_upper_limit != None:
-            idx = [i for i in idx if data[i] <=\
-                   self.params.request_upper_limit]
+            mask &= data <= self.params.request_upper_limit
         if self.params.request_lower_limit != None:
-            idx = [i for i in idx if data[i] >=\
-                   self.params.request_lower_limit]
-        discrete_data = [data[i] for i in idx]
-        cdf = [cdf[i] for i in idx]
-        return discrete_data, cdf
+            mask &= data >= self.params.request_lower_limit
+        return data[mask], cdf[mask]
 
     ''' Functions used for debuging or printing purposes '''
     
@@ -299,16 +722,21 @@ class ResourceEstimator():
     # Function that computes the cdf
     def _compute_cdf(self):
         # if all runs have the same execution time
-        if all(elem == self.data[0] for elem in self.data):
-            self.discrete_data = [self.data[0]]
-            self.cdf = [1]
+        if np.all(self.data == self.data[0]):
+            self.discrete_data = self.data[:1]
+            self.cdf = np.ones(1)
             return
 
         if self.fit_model is not None:
-            self.__get_interpolation_cdf(self.data)
-            valid = self._check_cdf_validity(self.cdf)
-            if valid:
-                return
+            if self.best_fit is None:
+                self.__compute_best_fit()
+            # without any successful fit (e.g. all over the time limit) the
+            # discrete CDF is used
+            if self.best_fit_index >= 0:
+                self.__get_interpolation_cdf(self.data)
+                valid = self._check_cdf_validity(self.cdf)
+                if valid:
+                    return
 
         self.__compute_discrete_cdf()
 
@@ -318,10 +746,10 @@ class ResourceEstimator():
 
     # Function to check if the cdf is [0,1] and strictly increasing
     def _check_cdf_validity(self, cdf):
-        test = all(elem >= 0 and elem <= 1 for elem in cdf)
-        if not test:
+        cdf = np.asarray(cdf, dtype=float)
+        if not np.all((cdf >= 0) & (cdf <= 1)):
             return False
-        return all(cdf[i - 1] <= cdf[i] for i in range(1, len(cdf)))
+        return bool(np.all(np.diff(cdf) >= 0))
 
     ''' Public functions '''
 
@@ -333,6 +761,11 @@ class ResourceEstimator():
         for model in self.fit_model:
             if model.discrete_steps < (self.discretization - 1):
                 model.discrete_steps = self.discretization - 1
+            if isinstance(model, DistInterpolation):
+                if model.workers is None:
+                    model.workers = self.params.fitting_workers
+                if model.timeout is None:
+                    model.timeout = self.params.fitting_timeout
         self.best_fit = None
         if len(self.fit_model) == 0:
             self.fit_model = None
@@ -341,9 +774,178 @@ class ResourceEstimator():
     def set_CR_strategy(self, CR_strategy):
         self.params.CR_strategy = CR_strategy
 
-    def compute_request_sequence(self, cluster_cost=None):
+    def __append(self, name, old, new):
+        ''' old followed by new, stored in a buffer with free space at the
+        end so that old is not copied while the buffer is large enough '''
+        size = len(old) + len(new)
+        buffer = self._buffers.get(name)
+        if buffer is None or old.base is not buffer or \
+                len(buffer) < size or \
+                not np.can_cast(new.dtype, buffer.dtype):
+            buffer = np.empty(max(size, 2 * len(old)),
+                              dtype=np.result_type(old, new))
+            buffer[:len(old)] = old
+            self._buffers[name] = buffer
+        buffer[len(old):size] = new
+        return buffer[:size]
+
+    def add_runs(self, runs, weights=None):
+        ''' Add new runs (or an histogram with weights) to the history. The
+        runs are appended to a buffer grown geometrically (amortized cost in
+        the number of new runs). When the last sequence was computed on the
+        discrete CDF without checkpointing, limits or interpolation, the
+        discrete CDF, sumF, sumFV and the E table are updated in place (only
+        the entries up to the largest new run are recomputed). The first
+        update builds the table. Otherwise the next call to
+        compute_request_sequence recomputes everything '''
+        runs = np.asarray(runs).ravel()
+        if len(runs) == 0:
+            return
+        if self.sketch is not None:
+            # the sketch is updated with the new runs only
+            self.__set_workload(runs, weights)
+            self._incremental = None
+            return
+        all_weights = None
+        if weights is not None or self.weights is not None:
+            old = self.weights if self.weights is not None else \
+                np.ones(len(self.data))
+            new = np.ones(len(runs)) if weights is None else \
+                np.asarray(weights, dtype=float).ravel()
+            all_weights = self.__append("weights", old, new)
+        self.__set_workload(self.__append("data", np.asarray(self.data),
+                                          runs), all_weights)
+        cluster_cost = self._last_cluster_cost
+        if cluster_cost is None or not self.__is_incremental(cluster_cost):
+            self._incremental = None
+            return
+
+        if self._incremental is None:
+            values, counts = self.__get_counts()
+            self._incremental = IncrementalRequestSequence(
+                values.tolist(), counts.tolist(), cluster_cost,
+                params=(self.params.request_increment_limit, ))
+        else:
+            self._incremental.add_values(runs, weights)
+        self.discrete_data = np.array(self._incremental.discret_values)
+        self.cdf = np.array(self._incremental._cdf) / \
+            self._incremental._cdf[-1]
+
+    def compute_request_sequence(self, cluster_cost=None, monitor=None):
+        ''' The optional SolveMonitor receives the progress of the E table
+        and can cancel the solve (SolveCancelled is raised) '''
         if cluster_cost == None:
             cluster_cost = ClusterCosts()
+        self._last_cluster_cost = cluster_cost
+        handler = self._incremental
+        if handler is not None and self.__is_incremental(cluster_cost) and \
+           (handler._alpha, handler._beta, handler._gamma) == (
+               cluster_cost.alpha, cluster_cost.beta, cluster_cost.gamma):
+            with self.__stage("traceback"):
+                sequence = handler.compute_request_sequence()
+            with self.__stage("submissions"):
+                self._avg_submissions = handler.check_avegage_submissions()
+            return sequence
+        self._incremental = None
+
+        if monitor is not None:
+            monitor.check()
+        with self.__stage("cdf"):
+            self._compute_cdf()
+        if monitor is not None:
+            monitor.check()
+        sequence_type, params = self.__get_sequence_type()
+        discrete_data, cdf = self.__trim_according_to_limits()
+        if len(cdf) < 100:
+            warnings.warn("Warning! Sequence is computed based on only" \
+                          "%d elements. It is recommended to " \
+                          "increase the discretization value." %(len(cdf)),
+                          stacklevel=2)
+        grid = self.params.multiresolution_grid
+        if grid is not None and sequence_type != RequestSequence and \
+           len(cdf) > grid:
+            solver = MultiResolutionSolver(sequence_type, params,
+                                           coarse_size=grid)
+            solver.monitor = monitor
+            with self.__stage("multiresolution"):
+                sequence = solver.solve(discrete_data, cdf, cluster_cost)
+            self._multiresolution_report = solver.report
+            handler = solver.handler
+        else:
+            # the E table is computed when the sequence class is created
+            with self.__stage("e_table"):
+                handler = sequence_type(discrete_data, cdf, cluster_cost,
+                                        params=params, monitor=monitor)
+            with self.__stage("traceback"):
+                sequence = handler.compute_request_sequence()
+        # compute the expected average submissions
+        with self.__stage("submissions"):
+            self._avg_submissions = handler.check_avegage_submissions()
+        if self.stats is not None:
+            states, nbytes = handler.get_table_stats()
+            self.stats.count("dp_states", states)
+            self.stats.set("e_table_bytes", nbytes)
+        return sequence
+
+    async def compute_request_sequence_async(self, cluster_cost=None,
+                                             progress=None, executor=None):
+        ''' Compute the sequence of requests in the executor (the default
+        one of the event loop if None) without blocking the event loop.
+        progress(fraction) is called in the event loop as the rows of the
+        E table are computed. Cancelling the task stops the solve at the
+        next row '''
+        loop = asyncio.get_running_loop()
+        callback = None
+        if progress is not None:
+            callback = lambda fraction: loop.call_soon_threadsafe(
+                progress, fraction)
+        monitor = SolveMonitor(callback)
+        future = loop.run_in_executor(executor, self.compute_request_sequence,
+                                      cluster_cost, monitor)
+        try:
+            return await future
+        except asyncio.CancelledError:
+            monitor.cancel()
+            raise
+
+    def compute_request_sequence_sweep(self, cluster_costs):
+        ''' Compute the sequence of requests for every ClusterCosts in the
+        list. The CDF is computed once and without checkpointing the suffix
+        sums are shared by all the costs. Returns the list of (sequence,
+        expected makespan) in the order of cluster_costs. The expected
+        makespan is the one of the dynamic program on the CDF used for the
+        solve (interpolated or from the sketch), not a replay of the past
+        runs (see compute_sequence_cost) '''
+        self._compute_cdf()
+        sequence_type, params = self.__get_sequence_type()
+        discrete_data, cdf = self.__trim_according_to_limits()
+        if len(cdf) < 100:
+            warnings.warn("Warning! Sequence is computed based on only" \
+                          "%d elements. It is recommended to " \
+                          "increase the discretization value." %(len(cdf)),
+                          stacklevel=2)
+        if sequence_type == RequestSequence:
+            sweep = RequestSequenceSweep(discrete_data, cdf, cluster_costs,
+                                         params=params)
+            return list(zip(sweep.compute_request_sequences(),
+                            sweep.get_expected_makespans().tolist()))
+        # the checkpoint costs are part of the table, one table per cost
+        results = []
+        for cost in cluster_costs:
+            handler = sequence_type(discrete_data, cdf, cost, params=params)
+            results.append((handler.compute_request_sequence(),
+                            float(handler.get_expected_makespan())))
+        return results
+
+    def compute_submissions_frontier(self, cluster_cost=None):
+        ''' Compute the sequences for every submission limit from 1 to
+        params.submissions_limit (ThresholdBased) with one dynamic program.
+        Returns the list of (limit, sequence, expected makespan, expected
+        average submissions) '''
+        if cluster_cost == None:
+            cluster_cost = ClusterCosts()
+        assert (self.params.submissions_limit is not None), \
+            "The submissions limit needs to be set"
         self._compute_cdf()
         sequence_type, params = self.__get_sequence_type()
         discrete_data, cdf = self.__trim_according_to_limits()
@@ -354,35 +956,362 @@ class ResourceEstimator():
                           stacklevel=2)
         handler = sequence_type(discrete_data, cdf,
                                 cluster_cost, params=params)
-        sequence = handler.compute_request_sequence()
-        # compute the expected average submissions
-        self._avg_submissions = handler.check_avegage_submissions()
-        return sequence
+        return handler.compute_frontier()
 
-    def compute_sequence_cost(self, sequence, data, cluster_cost=None):
+    def compute_sequence_cost(self, sequence, data, cluster_cost=None,
+                              weights=None):
         if cluster_cost == None:
             cluster_cost = ClusterCosts()
         handler = LogDataCost(sequence)
-        return (handler.compute_cost(data, cluster_cost),
+        return (handler.compute_cost(data, cluster_cost, weights=weights),
                 self._avg_submissions)
 
+
+# state shared by the tasks of a BatchEstimator worker process
+_batch_worker = {}
+
+
+def _init_batch_worker(memory_name, params, cluster_cost):
+    _batch_worker["memory"] = shared_memory.SharedMemory(name=memory_name)
+    _batch_worker["params"] = params
+    _batch_worker["cluster_cost"] = cluster_cost
+
+
+def _batch_estimate(key, offset, length):
+    # the history is a view in the shared memory block (no copy)
+    history = np.ndarray((length, ), dtype=np.float64, offset=offset * 8,
+                         buffer=_batch_worker["memory"].buf)
+    wl = ResourceEstimator(history, params=_batch_worker["params"])
+    sequence = wl.compute_request_sequence(
+        cluster_cost=_batch_worker["cluster_cost"])
+    return key, sequence, wl._avg_submissions
+
+
+class BatchEstimator():
+    ''' Class used to generate the sequences of requests for many
+    applications sharing the same ResourceParameters and ClusterCosts.
+    The histories are copied once in a shared memory block and the
+    estimations run in a pool of processes, largest history first '''
+
+    def __init__(self, params=ResourceParameters(), cluster_cost=None,
+                 workers=None):
+        self.params = params
+        self.cluster_cost = cluster_cost
+        if cluster_cost is None:
+            self.cluster_cost = ClusterCosts()
+        self.workers = workers
+        self.errors = {}
+
+    def compute_request_sequences(self, histories):
+        ''' Generator over (key, sequence, average submissions) for the
+        {key: past_runs} mapping, in the order the estimations finish.
+        Failed estimations are skipped and stored in self.errors '''
+        self.errors = {}
+        keys = sorted(histories, key=lambda k: len(histories[k]),
+                      reverse=True)
+        offsets = np.cumsum([0] + [len(histories[k]) for k in keys])
+        memory = shared_memory.SharedMemory(
+            create=True, size=max(1, int(offsets[-1]) * 8))
+        try:
+            data = np.ndarray((offsets[-1], ), dtype=np.float64,
+                              buffer=memory.buf)
+            for i in range(len(keys)):
+                data[offsets[i]:offsets[i + 1]] = histories[keys[i]]
+            del data
+            with ProcessPoolExecutor(
+                    max_workers=self.workers, initializer=_init_batch_worker,
+                    initargs=(memory.name, self.params,
+                              self.cluster_cost)) as executor:
+                futures = {executor.submit(
+                    _batch_estimate, keys[i], int(offsets[i]),
+                    int(offsets[i + 1] - offsets[i])): keys[i]
+                    for i in range(len(keys))}
+                try:
+                    for future in as_completed(futures):
+                        try:
+                            yield future.result()
+                        except Exception as error:
+                            self.errors[futures[future]] = error
+                finally:
+                    # stop pending estimations if the caller stops early
+                    for future in futures:
+                        future.cancel()
+        finally:
+            memory.close()
+            memory.unlink()
+
+
+# state shared by the tasks of a BootstrapEvaluator worker process
+_bootstrap_worker = {}
+
+
+def _init_bootstrap_worker(memory_name, train_size, test_size, params,
+                           cluster_cost):
+    memory = shared_memory.SharedMemory(name=memory_name)
+    _bootstrap_worker["memory"] = memory
+    # (values, probabilities) of the training runs and (values, counts)
+    # of the replayed runs, views in the shared memory block
+    blocks = np.cumsum([0, train_size, train_size, test_size, test_size])
+    _bootstrap_worker["arrays"] = [
+        np.ndarray((blocks[i + 1] - blocks[i], ), dtype=np.float64,
+                   offset=int(blocks[i]) * 8, buffer=memory.buf)
+        for i in range(4)]
+    _bootstrap_worker["params"] = params
+    _bootstrap_worker["cluster_cost"] = cluster_cost
+
+
+def _bootstrap_task(seed, resamples, runs, upper_bound):
+    values, probabilities, test_values, test_counts = \
+        _bootstrap_worker["arrays"]
+    rng = np.random.default_rng(seed)
+    # the estimator draws from the global generator (e.g. to reduce the
+    # discretization), it is seeded from the stream of the task
+    np.random.seed(rng.integers(2**32))
+    # all the resamples are drawn at once as histograms of the training
+    counts = rng.multinomial(runs, probabilities, size=resamples)
+    sequences = []
+    submissions = []
+    for count in counts:
+        keep = count > 0
+        history, weights = values[keep], count[keep]
+        if upper_bound is not None:
+            history = np.append(history, upper_bound)
+            weights = np.append(weights, 1)
+        wl = ResourceEstimator(history, params=_bootstrap_worker["params"],
+                               weights=weights)
+        with warnings.catch_warnings():
+            # resamples have fewer distinct values than the history, the
+            # warning about the small discretization is expected
+            warnings.simplefilter("ignore", UserWarning)
+            sequences.append(wl.compute_request_sequence(
+                cluster_cost=_bootstrap_worker["cluster_cost"]))
+        submissions.append(wl._avg_submissions)
+    cost, _ = LogDataCost.compute_cost_matrix(
+        sequences, test_values, _bootstrap_worker["cluster_cost"])
+    return cost @ test_counts / np.sum(test_counts), submissions, sequences
+
+
+class BootstrapEvaluator():
+    ''' Confidence intervals of the quality of the sequences computed from
+    a (training) history. The training runs are resampled with replacement
+    (drawn as histograms, in batches of batch_size resamples), a sequence
+    is computed for each resample and replayed on the data with
+    LogDataCost. The cost is compared with the one of the sequence computed
+    on the data itself. The batches run in a pool of processes, each batch
+    with its own random stream spawned from seed, so the results do not
+    depend on the number of workers.
+
+    Example: BootstrapEvaluator(resamples=500, seed=1).evaluate(
+                 data[:50], data) '''
+
+    def __init__(self, params=ResourceParameters(), cluster_cost=None,
+                 resamples=200, batch_size=10, seed=None, workers=None):
+        assert (resamples > 0 and batch_size > 0), \
+            "Invalid number of resamples"
+        self.params = params
+        self.cluster_cost = cluster_cost
+        if cluster_cost is None:
+            self.cluster_cost = ClusterCosts()
+        self.resamples = resamples
+        self.batch_size = batch_size
+        self.seed = seed
+        self.workers = workers
+        self.errors = {}
+
+    def __run_batches(self, values, probabilities, test_values, test_counts,
+                      runs, upper_bound):
+        batches = [min(self.batch_size, self.resamples - i) for i in range(
+            0, self.resamples, self.batch_size)]
+        seeds = np.random.SeedSequence(self.seed).spawn(len(batches))
+        arrays = [values, probabilities, test_values, test_counts]
+        memory = shared_memory.SharedMemory(
+            create=True, size=max(1, sum(len(i) for i in arrays) * 8))
+        results = [None] * len(batches)
+        try:
+            data = np.ndarray((sum(len(i) for i in arrays), ),
+                              dtype=np.float64, buffer=memory.buf)
+            data[:] = np.concatenate(arrays)
+            del data
+            with ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    initializer=_init_bootstrap_worker,
+                    initargs=(memory.name, len(values), len(test_values),
+                              self.params, self.cluster_cost)) as executor:
+                futures = {executor.submit(
+                    _bootstrap_task, seeds[i], batches[i], runs,
+                    upper_bound): i for i in range(len(batches))}
+                for future in as_completed(futures):
+                    try:
+                        results[futures[future]] = future.result()
+                    except Exception as error:
+                        self.errors[futures[future]] = error
+        finally:
+            memory.close()
+            memory.unlink()
+        return [result for result in results if result is not None]
+
+    def evaluate(self, training, data=None, confidence=0.95,
+                 include_max=True):
+        ''' Returns a dictionary with the cost of the sequence computed on
+        data (reference_cost), the cost, average submissions and sequence
+        of each resample, the ratios to the reference cost, their mean and
+        the confidence interval. With include_max the largest run of data
+        is added to each resample (like in check_sequence_goodness) so all
+        the runs are covered by the sequences. Failed batches are stored in
+        self.errors '''
+        assert (len(training) > 0), "Empty training history"
+        assert (0 < confidence < 1), "Invalid confidence level"
+        self.errors = {}
+        training = np.asarray(training, dtype=float)
+        data = training if data is None else np.asarray(data, dtype=float)
+        values, counts = np.unique(training, return_counts=True)
+        test_values, test_counts = np.unique(data, return_counts=True)
+
+        wl = ResourceEstimator(test_values, params=self.params,
+                               weights=test_counts)
+        reference = wl.compute_request_sequence(
+            cluster_cost=self.cluster_cost)
+        reference_cost = LogDataCost(reference).compute_cost(
+            test_values, self.cluster_cost, weights=test_counts)
+
+        upper_bound = float(test_values[-1]) if include_max else None
+        results = self.__run_batches(values, counts / len(training),
+                                     test_values, test_counts.astype(float),
+                                     len(training), upper_bound)
+        assert (len(results) > 0), "All the resamples failed"
+        costs = np.concatenate([result[0] for result in results])
+        ratios = costs / reference_cost
+        bounds = np.quantile(ratios, [(1 - confidence) / 2,
+                                      (1 + confidence) / 2])
+        return {"reference_sequence": reference,
+                "reference_cost": reference_cost,
+                "costs": costs,
+                "ratios": ratios,
+                "submissions": np.concatenate(
+                    [result[1] for result in results]),
+                "sequences": [sequence for result in results
+                              for sequence in result[2]],
+                "mean": np.mean(ratios),
+                "interval": (float(bounds[0]), float(bounds[1]))}
+
 # -------------
 # Classes for defining how the interpolation will be done
 # -------------
 
 
+class FitCache():
+    ''' On-disk cache mapping the fingerprint of a discrete CDF to the best
+    interpolation fit. Each entry is a JSON file written atomically so the
+    cache can be shared by concurrent processes; the least recently used
+    entries are removed once the cache holds more than max_entries '''
+
+    def __init__(self, path=None, max_entries=1000):
+        if path is None:
+            path = os.path.join(os.path.expanduser("~"), ".cache", "iSBatch")
+        self.path = path
+        self.max_entries = max_entries
+        os.makedirs(self.path, exist_ok=True)
+
+    @staticmethod
+    def fingerprint(discrete_data, cdf, description=None):
+        digest = hashlib.sha256()
+        digest.update(np.ascontiguousarray(
+            discrete_data, dtype=np.float64).tobytes())
+        digest.update(np.ascontiguousarray(cdf, dtype=np.float64).tobytes())
+        digest.update(json.dumps(description).encode())
+        return digest.hexdigest()
+
+    def __entry(self, key):
+        return os.path.join(self.path, key + ".json")
+
+    def get(self, key):
+        try:
+            with open(self.__entry(key)) as fp:
+                entry = json.load(fp)
+        except (OSError, ValueError):
+            return None
+        # the modification time keeps track of the last use
+        try:
+            os.utime(self.__entry(key))
+        except OSError:
+            pass
+        return entry
+
+    def put(self, key, entry):
+        # write to a temporary file and rename it so that readers never
+        # see a partially written entry
+        tmp_name = None
+        try:
+            fd, tmp_name = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+            with os.fdopen(fd, "w") as fp:
+                json.dump(entry, fp)
+            os.replace(tmp_name, self.__entry(key))
+        except OSError:
+            if tmp_name is not None and os.path.exists(tmp_name):
+                os.remove(tmp_name)
+            return
+        self.evict()
+
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.path):
+            if not name.endswith(".json"):
+                continue
+            name = os.path.join(self.path, name)
+            try:
+                entries.append((os.path.getmtime(name), name))
+            except OSError:
+                # removed by another process
+                continue
+        entries.sort()
+        for _, name in entries[:max(0, len(entries) - self.max_entries)]:
+            try:
+                os.remove(name)
+            except OSError:
+                pass
+
+    def __len__(self):
+        return len([name for name in os.listdir(self.path)
+                    if name.endswith(".json")])
+
+
 class InterpolationModel():
     # define the format of the return values for the get_best_fit functions
     def get_empty_fit(self):
         return (-1, -1, np.inf)
 
+    # the description identifies the model configuration in the fit cache
+    def describe(self):
+        return [type(self).__name__]
+
+    def encode_fit(self, fit):
+        return [fit[0], np.asarray(fit[1]).tolist(), float(fit[2])]
+
+    def decode_fit(self, entry):
+        return (entry[0], np.array(entry[1]), entry[2])
+
     def discretize_data(self, data, discrete_steps):
-        upper_limit = max(data)
-        lower_limit = min(data)
+        upper_limit = np.max(data)
+        lower_limit = np.min(data)
         step = (upper_limit - lower_limit) / discrete_steps
-        return np.unique(
-            [lower_limit + i * step for i in range(discrete_steps)]
-            + [upper_limit])
+        return np.unique(np.append(
+            lower_limit + np.arange(discrete_steps) * step, upper_limit))
+
+    # clip the cdf to [0, 1] and make sure it is always increasing
+    def monotone_cdf(self, cdf):
+        return np.maximum.accumulate(np.clip(cdf, 0, 1))
+
+    # weights normalized to a mean of 1 (None if the fit is not weighted)
+    def normalize_weights(self, x, weights):
+        if weights is None:
+            return None
+        weights = np.asarray(weights, dtype=float)
+        return weights * len(x) / np.sum(weights)
+
+    def squared_error(self, residuals, weights=None):
+        if weights is None:
+            return np.sum(residuals**2)
+        return np.sum(weights * residuals**2)
 
 
 class FunctionInterpolation(InterpolationModel):
@@ -394,26 +1323,41 @@ class FunctionInterpolation(InterpolationModel):
 
     def get_discrete_cdf(self, data, best_fit):
         all_data = self.discretize_data(data, self.discrete_steps)
-        all_cdf = [max(0, min(1, np.polyval(best_fit, self.fct(d))))
-                   for d in all_data]
-        # make sure the cdf is always increasing
-        for i in range(1, len(all_cdf)):
-            if all_cdf[i] < all_cdf[i-1]:
-                all_cdf[i] = all_cdf[i-1]
+        all_cdf = self.monotone_cdf(
+            np.polyval(best_fit[1], self.fct(all_data)))
         return all_data, all_cdf
 
     # fitting the function a + b * fct
-    def get_best_fit(self, x, y):
+    def get_best_fit(self, x, y, weights=None):
+        weights = self.normalize_weights(x, weights)
+        # polyfit weights multiply the residuals, not their square
+        w = None if weights is None else np.sqrt(weights)
         try:
-            params = np.polyfit(self.fct(x), y, self.order)
+            params = np.polyfit(self.fct(x), y, self.order, w=w)
         except:
             return self.get_empty_fit()
-        err = np.sum((np.polyval(params, self.fct(x)) - y)**2)
+        err = self.squared_error(np.polyval(params, self.fct(x)) - y,
+                                 weights)
         return (self.order, params, err)
 
     def get_cdf(self, x, params):
         return np.polyval(params, self.fct(x))
 
+    def describe(self):
+        # lambdas all share the name <lambda>, their code and closure
+        # identify the function
+        code = getattr(self.fct, "__code__", None)
+        digest = None
+        if code is not None:
+            closure = [cell.cell_contents
+                       for cell in self.fct.__closure__ or []]
+            digest = hashlib.sha256(code.co_code + repr(
+                (code.co_consts, code.co_names, closure)).encode()).hexdigest()
+        name = getattr(self.fct, "__qualname__",
+                       getattr(self.fct, "__name__", None))
+        return [type(self).__name__, getattr(self.fct, "__module__", None),
+                name, digest, self.order]
+
 
 class PolyInterpolation(InterpolationModel):
 
@@ -421,30 +1365,32 @@ class PolyInterpolation(InterpolationModel):
         self.max_order = max_order
         self.discrete_steps = discretization - 1
 
+    def describe(self):
+        return [type(self).__name__, self.max_order]
+
     def get_discrete_cdf(self, data, best_fit):
         all_data = self.discretize_data(data, self.discrete_steps)
-        all_cdf = [max(0, min(1, np.polyval(best_fit[1], d)))
-                   for d in all_data]
-        # make sure the cdf is always increasing
-        for i in range(1, len(all_cdf)):
-            if all_cdf[i] < all_cdf[i-1]:
-                all_cdf[i] = all_cdf[i-1]
+        all_cdf = self.monotone_cdf(np.polyval(best_fit[1], all_data))
         return all_data, all_cdf
 
-    def get_best_fit(self, x, y):
+    def get_best_fit(self, x, y, weights=None):
         empty = self.get_empty_fit()
         best_err = empty[2]
         best_params = empty[1]
         best_order = empty[0]
+        weights = self.normalize_weights(x, weights)
+        # polyfit weights multiply the residuals, not their square
+        w = None if weights is None else np.sqrt(weights)
         for order in range(1, self.max_order):
             with warnings.catch_warnings():
                 warnings.simplefilter("error")
                 try:
-                    params = np.polyfit(x, y, order)
+                    params = np.polyfit(x, y, order, w=w)
                 except:
                     break
 
-                err = np.sum((np.polyval(params, x) - y)**2)
+                err = self.squared_error(np.polyval(params, x) - y,
+                                         weights)
                 if err < best_err:
                     best_order = order
                     best_params = params
@@ -453,21 +1399,136 @@ class PolyInterpolation(InterpolationModel):
         return (best_order, best_params, best_err)
 
 
+def _fit_timeout(signum, frame):
+    raise TimeoutError("Distribution fit exceeded the time limit")
+
+
+def _weighted_sample(x, weights, size=1000):
+    ''' Deterministic sample of size values following the weights of x
+    (the midpoints of size equal quantiles), used for the fits that do not
+    accept weights '''
+    cdf = np.cumsum(weights) / np.sum(weights)
+    idx = np.searchsorted(cdf, (np.arange(size) + 0.5) / size)
+    return np.asarray(x)[np.minimum(idx, len(x) - 1)]
+
+
+def _fit_distribution(distribution, x, y, timeout=None, weights=None):
+    ''' Fit one distribution on the data and return (params, sse) or None
+    if the fit fails or does not finish in timeout seconds. With weights the
+    distribution is fitted on a weighted sample of x. Module level so that
+    it can be sent to the worker processes '''
+    use_alarm = timeout is not None and hasattr(signal, "setitimer") and \
+        threading.current_thread() is threading.main_thread()
+    handler_set = False
+    try:
+        # the alarm is armed inside the try so that it can never escape
+        if use_alarm:
+            previous_handler = signal.signal(signal.SIGALRM, _fit_timeout)
+            handler_set = True
+            signal.setitimer(signal.ITIMER_REAL, timeout)
+        # Ignore warnings from data that can't be fit
+        with warnings.catch_warnings():
+            warnings.filterwarnings('ignore')
+
+            # fit dist to data
+            if weights is None:
+                params = distribution.fit(x)
+            else:
+                params = distribution.fit(_weighted_sample(x, weights))
+
+            # Separate parts of parameters
+            arg = params[:-2]
+            loc = params[-2]
+            scale = params[-1]
+
+            # Calculate fitted PDF and error with fit in distribution
+            pdf = distribution.pdf(x, loc=loc, scale=scale, *arg)
+            if weights is None:
+                sse = np.sum(np.power(y - pdf, 2.0))
+            else:
+                sse = np.sum(weights * np.power(y - pdf, 2.0))
+        return (params, sse)
+    except Exception:
+        return None
+    finally:
+        if handler_set:
+            try:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+            except TimeoutError:
+                # the alarm fired after the fit ended (it is not periodic)
+                pass
+            signal.signal(signal.SIGALRM, previous_handler)
+
+
+def _timed_fit_distribution(distribution, x, y, timeout=None,
+                            weights=None):
+    start = time.perf_counter()
+    fit = _fit_distribution(distribution, x, y, timeout, weights)
+    return fit, time.perf_counter() - start
+
+
 class DistInterpolation(InterpolationModel):
-    def __init__(self, list_of_distr=[], discretization=500):
+    ''' Fits a list of scipy.stats distributions on the data. With more
+    than one worker the distributions are fitted in a process pool; fits
+    taking more than timeout seconds are dropped '''
+
+    def __init__(self, list_of_distr=[], discretization=500, workers=None,
+                 timeout=None):
         self.distr = list_of_distr
         self.discrete_steps = discretization - 1
+        self.workers = workers
+        self.timeout = timeout
+        self.fit_times = []
 
     def get_discrete_cdf(self, data, best_fit):
         arg = best_fit[1][:-2]
         loc = best_fit[1][-2]
         scale = best_fit[1][-1]
         all_data = self.discretize_data(data, self.discrete_steps)
-        all_cdf = [best_fit[0].cdf(d, loc=loc, scale=scale, *arg)
-                   for d in all_data]
+        all_cdf = self.monotone_cdf(
+            best_fit[0].cdf(all_data, loc=loc, scale=scale, *arg))
         return all_data, all_cdf
 
-    def get_best_fit(self, x, y):
+    def describe(self):
+        return [type(self).__name__] + [dist.name for dist in self.distr]
+
+    def encode_fit(self, fit):
+        if fit[0] == -1:
+            return [None, [], float(fit[2])]
+        return [fit[0].name, [float(i) for i in fit[1]], float(fit[2])]
+
+    def decode_fit(self, entry):
+        distribution = -1
+        if entry[0] is not None:
+            distribution = getattr(st, entry[0])
+        return (distribution, tuple(entry[1]), entry[2])
+
+    def fit_distributions(self, dist_list, x, y, weights=None):
+        ''' Returns the (params, sse) fit for each distribution in the
+        order of dist_list (None for failed fits). The time of each fit is
+        kept in fit_times as (name, seconds, success) '''
+        if self.workers is None or self.workers <= 1:
+            results = [_timed_fit_distribution(distribution, x, y,
+                                               self.timeout, weights)
+                       for distribution in dist_list]
+        else:
+            results = []
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                futures = [executor.submit(_timed_fit_distribution,
+                                           distribution, x, y,
+                                           self.timeout, weights)
+                           for distribution in dist_list]
+                for future in futures:
+                    try:
+                        results.append(future.result())
+                    except Exception:
+                        results.append((None, 0))
+        self.fit_times = [(distribution.name, seconds, fit is not None)
+                          for distribution, (fit, seconds)
+                          in zip(dist_list, results)]
+        return [fit for fit, _ in results]
+
+    def get_best_fit(self, x, y, weights=None):
         dist_list = self.distr
         if len(dist_list) == 0:
             # list of distributions to check
@@ -484,33 +1545,20 @@ class DistInterpolation(InterpolationModel):
         best_params = (0.0, 1.0)
         best_sse = np.inf
 
-        # estimate distribution parameters from data
-        for distribution in dist_list:
-            # Try to fit the distribution
-            try:
-                # Ignore warnings from data that can't be fit
-                with warnings.catch_warnings():
-                    warnings.filterwarnings('ignore')
-
-                    # fit dist to data
-                    params = distribution.fit(x)
-
-                    # Separate parts of parameters
-                    arg = params[:-2]
-                    loc = params[-2]
-                    scale = params[-1]
-
-                    # Calculate fitted PDF and error with fit in distribution
-                    pdf = distribution.pdf(x, loc=loc, scale=scale, *arg)
-                    sse = np.sum(np.power(y - pdf, 2.0))
-
-                    # identify if this distribution is better
-                    if best_sse > sse > 0:
-                        best_distribution = distribution
-                        best_params = params
-                        best_sse = sse
-            except Exception:
-                pass
+        # estimate distribution parameters from data; the fits are checked
+        # in the order of the list so the choice does not depend on which
+        # worker finishes first
+        fits = self.fit_distributions(dist_list, x, y,
+                                      self.normalize_weights(x, weights))
+        for distribution, fit in zip(dist_list, fits):
+            if fit is None:
+                continue
+            params, sse = fit
+            # identify if this distribution is better
+            if best_sse > sse > 0:
+                best_distribution = distribution
+                best_params = params
+                best_sse = sse
 
         return (best_distribution, best_params, best_sse)
 
@@ -519,12 +1567,136 @@ class DistInterpolation(InterpolationModel):
 # -------------
 
 
+class LowerEnvelope():
+    ''' Lower envelope of a set of lines (convex hull trick) used to compute
+    min_j(slope_j * x + offset_j + value_j) in amortized constant time.
+    Lines need to be added in non-increasing order of their slope and
+    between equal values the line added first is chosen. With
+    keep_history=True the lines removed by each add_line are kept so that
+    the last insertions can be undone with rollback '''
+
+    tolerance = 1e-9
+
+    def __init__(self, keep_history=False):
+        self._lines = []
+        self._ptr = 0
+        self._last_x = -np.inf
+        self._history = [] if keep_history else None
+
+    def __value(self, k, x):
+        line = self._lines[k]
+        return line[0] * x + line[1] + line[2]
+
+    def add_line(self, slope, offset, value, index):
+        intercept = offset + value
+        removed = []
+        while len(self._lines) > 0:
+            last = self._lines[-1]
+            last_intercept = last[1] + last[2]
+            # parallel lines, keep only the lowest one
+            if last[0] == slope:
+                if last_intercept <= intercept:
+                    if self._history is not None:
+                        self._history.append((removed, False))
+                    return
+                removed.append(self._lines.pop())
+                continue
+            if len(self._lines) < 2:
+                break
+            prev = self._lines[-2]
+            # remove the last line if it is never below both its neighbours
+            # (intersection with the new line comes first); lines that are
+            # collinear up to rounding are kept so that ties are decided
+            # on the evaluated makespans
+            lhs = (intercept - last_intercept) * (prev[0] - last[0])
+            rhs = (last_intercept - prev[1] - prev[2]) * (last[0] - slope)
+            if lhs < rhs - self.tolerance * (abs(lhs) + abs(rhs)):
+                removed.append(self._lines.pop())
+                continue
+            break
+        self._lines.append((slope, offset, value, index))
+        self._ptr = min(self._ptr, max(0, len(self._lines) - 2))
+        if self._history is not None:
+            self._history.append((removed, True))
+
+    def rollback(self, count):
+        ''' Undo the last count calls to add_line '''
+        assert (self._history is not None), \
+            "The envelope does not keep its history"
+        for _ in range(count):
+            removed, added = self._history.pop()
+            if added:
+                self._lines.pop()
+            self._lines.extend(reversed(removed))
+        # the next query can not start from the previous position
+        self._ptr = 0
+        self._last_x = np.inf
+
+    def query(self, x):
+        ''' Returns the index of the line minimal in x and its value '''
+        if x < self._last_x:
+            # queries are not monotone, binary search the envelope
+            lo = 0
+            hi = len(self._lines) - 1
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if self.__value(mid + 1, x) < self.__value(mid, x):
+                    lo = mid + 1
+                else:
+                    hi = mid
+            self._ptr = lo
+        else:
+            while self._ptr + 1 < len(self._lines) and \
+                  self.__value(self._ptr + 1, x) < self.__value(self._ptr, x):
+                self._ptr += 1
+        self._last_x = x
+        return self._lines[self._ptr][3], self.__value(self._ptr, x)
+
+
+class SolveCancelled(Exception):
+    ''' Raised inside a solve whose SolveMonitor was cancelled '''
+    pass
+
+
+class SolveMonitor():
+    ''' Progress and cancellation of one solve. The sequence classes call
+    update after each row of the E table with the fraction of rows
+    completed; the callback is called every min_step of progress and a
+    cancelled monitor stops the solve at the next row (SolveCancelled) '''
+
+    def __init__(self, callback=None, min_step=0.01):
+        self.callback = callback
+        self.min_step = min_step
+        self.progress = 0
+        self._last = -np.inf
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def is_cancelled(self):
+        return self._cancelled.is_set()
+
+    def check(self):
+        if self._cancelled.is_set():
+            raise SolveCancelled("The solve was cancelled")
+
+    def update(self, fraction):
+        self.check()
+        self.progress = fraction
+        if self.callback is not None and (
+                fraction - self._last >= self.min_step or fraction == 1):
+            self._last = fraction
+            self.callback(fraction)
+
+
 class DefaultRequests():
     ''' Default class for generating the sequence of requests given 
     an application behavior and system properties '''
 
     def __init__(self, discrete_values, cdf_values,
-                 cluster_cost, params=0):
+                 cluster_cost, params=0, monitor=None):
+        self.monitor = monitor
         self._alpha = cluster_cost.alpha
         self._beta = cluster_cost.beta
         self._gamma = cluster_cost.gamma
@@ -535,7 +1707,7 @@ class DefaultRequests():
 
         self.discret_values = discrete_values
         self._cdf = cdf_values
-        self.upper_limit = max(self.discret_values)
+        self.upper_limit = np.max(self.discret_values)
         self._E = {}
         self._request_sequence = []
 
@@ -543,23 +1715,40 @@ class DefaultRequests():
         self._sumFV = self.compute_FV()
         self._index_sequence = []
 
+    def get_table_stats(self):
+        ''' Number of entries of the E table and its size in bytes '''
+        if hasattr(self._E, "nbytes"):
+            return len(self._E), self._E.nbytes
+        # dictionary of (makespan, request, checkpoint) tuples
+        nbytes = sys.getsizeof(self._E) + sum(
+            sys.getsizeof(val) + sum(sys.getsizeof(i) for i in val)
+            for val in self._E.values())
+        return len(self._E), nbytes
+
+    # report that done out of total rows of the E table are computed
+    def report_rows(self, done, total):
+        if self.monitor is not None:
+            self.monitor.update(done / max(total, 1))
+
     def compute_F(self, vi):
         fi = self._cdf[vi]
         if vi > 0:
             fi -= self._cdf[vi-1]
         return fi / self._cdf[-1]
 
+    # f[k] for all the discrete values
+    def get_discrete_F(self):
+        cdf = np.asarray(self._cdf, dtype=float)
+        return np.diff(cdf, prepend=0) / cdf[-1]
+
     def compute_FV(self):
-        FV = 0
-        for i in range(len(self.discret_values)):
-            FV += (self.discret_values[i] * self.compute_F(i))
-        return FV
+        return np.cumsum(np.asarray(self.discret_values, dtype=float)
+                         * self.get_discrete_F())[-1]
 
     # Compute sumF[i] as sum_k=i,n f[k]
     def get_discrete_sum_F(self):
-        sumF = (len(self.discret_values) + 1) * [0]
-        for k in range(len(self.discret_values) - 1, -1, -1):
-            sumF[k] = self.compute_F(k) + sumF[k + 1]
+        sumF = np.zeros(len(self.discret_values) + 1)
+        sumF[:-1] = np.cumsum(self.get_discrete_F()[::-1])[::-1]
         return sumF
 
     def compute_E_value(self, i):
@@ -582,29 +1771,37 @@ class DefaultRequests():
             return True
         return False
 
-    def check_avegage_submissions(self):
-        if len(self._index_sequence) == 0:
+    def check_avegage_submissions(self, index_sequence=None):
+        if index_sequence is None:
+            index_sequence = self._index_sequence
+        if len(index_sequence) == 0:
             return -1
         # t the sequence of reservations, avg = 1 + P(X>t1) + P(X>t2) + ...
         avg = 1
-        for j in self._index_sequence:
+        for j in index_sequence:
             avg += self._sumF[j + 1]
         return avg
 
     def compute_request_sequence(self):
         if len(self._request_sequence) > 0:
             return self._request_sequence
+        self._request_sequence, self._index_sequence = \
+            self.trace_request_sequence(self.threshold)
+        return self._request_sequence
+
+    def trace_request_sequence(self, th):
+        ''' Returns the sequence of requests starting from E[(-1, -1)] with
+        th submissions and the indexes of the requests '''
+        request_sequence = []
+        index_sequence = []
         ic = -1
         il = -1
-        th = self.threshold
-        idx = self._E_index[(ic, il)][th]
-        E_val = self._E[(ic, il)][idx]
+        E_val = self._E[(ic, il, th)]
         already_compute = 0
-        self._index_sequence = []
         while E_val[1] < len(self.discret_values) - 2:
-            self._request_sequence.append(
+            request_sequence.append(
                 (self.discret_values[E_val[1]] - already_compute, E_val[2]))
-            self._index_sequence.append(E_val[1])
+            index_sequence.append(E_val[1])
             ic = (1 - E_val[2]) * ic + (E_val[1] + 1) * E_val[2]
             il = E_val[1] + 1
             if self.th_strategy == LimitStrategy.AverageBased:
@@ -614,13 +1811,12 @@ class DefaultRequests():
                 th -= 1
             if E_val[2] == 1:
                 already_compute = self.discret_values[E_val[1]]
-            idx = self._E_index[(ic, il)][th]
-            E_val = self._E[(ic, il)][idx]
+            E_val = self._E[(ic, il, th)]
 
-        self._request_sequence.append(
+        request_sequence.append(
             (self.discret_values[E_val[1]] - already_compute, 0))
-        self._index_sequence.append(E_val[1])
-        return self._request_sequence
+        index_sequence.append(E_val[1])
+        return request_sequence, index_sequence
 
 
 class RequestSequence(DefaultRequests):
@@ -628,21 +1824,58 @@ class RequestSequence(DefaultRequests):
     values (instead of a continuous space) '''
 
     def __init__(self, discrete_values, cdf_values,
-                 cluster_cost, params=[0]):
+                 cluster_cost, params=[0], monitor=None):
 
         super().__init__(discrete_values, cdf_values, cluster_cost,
-                         params=params)
+                         params=params, monitor=monitor)
         E_val = self.compute_E_value(0)
         self.__t1 = self.discret_values[E_val[1]]
         self.__makespan = E_val[0]
 
+    def get_expected_makespan(self):
+        return self.__makespan
+
     def makespan_init_value(self, i, j):
         init = float(self._alpha * self.discret_values[j] + self._gamma) \
             * self._sumF[i]
         init += self._beta * self.discret_values[j] * self._sumF[j + 1]
         return init
 
+    def has_monotone_slopes(self):
+        # the lines alpha * v_j + gamma need to be added in decreasing
+        # order of their slope for the lower envelope to be valid
+        if self._alpha < 0:
+            return False
+        return bool(np.all(np.diff(self.discret_values) >= 0))
+
     def compute_E_table(self, first):
+        self._E[len(self.discret_values)] = (
+            self._beta * self._sumFV, len(self.discret_values) - 1, 0)
+        # the increment limit depends on the next request so the
+        # makespan is no longer a line in sumF[i]
+        if self.makespan_increment_limit > 0 or \
+           not self.has_monotone_slopes():
+            return self.compute_E_table_quadratic(first)
+        return self.compute_E_table_envelope(first)
+
+    def compute_E_table_envelope(self, first):
+        # each request j gives the line (alpha * v_j + gamma) * sumF[i]
+        # + beta * v_j * sumF[j + 1] + E[j + 1] so E[i] is the lower
+        # envelope of the lines j >= i evaluated in sumF[i] (makespans equal
+        # up to rounding can lead to a different but equally good request)
+        envelope = LowerEnvelope()
+        for i in range(len(self.discret_values) - 1, first - 1, -1):
+            vi = self.discret_values[i]
+            envelope.add_line(float(self._alpha * vi + self._gamma),
+                              self._beta * vi * self._sumF[i + 1],
+                              self._E[i + 1][0], i)
+            min_request, min_makespan = envelope.query(self._sumF[i])
+            self._E[i] = (min_makespan, min_request, 0)
+            self.report_rows(len(self.discret_values) - i,
+                             len(self.discret_values) - first)
+        return self._E[first]
+
+    def compute_E_table_quadratic(self, first):
         self._E[len(self.discret_values)] = (
             self._beta * self._sumFV, len(self.discret_values) - 1, 0)
         for i in range(len(self.discret_values) - 1, first - 1, -1):
@@ -656,6 +1889,8 @@ class RequestSequence(DefaultRequests):
                     min_makespan = makespan
                     min_request = j
             self._E[i] = (min_makespan, min_request, 0)
+            self.report_rows(len(self.discret_values) - i,
+                             len(self.discret_values) - first)
         return self._E[first]
 
     def compute_request_sequence(self):
@@ -680,69 +1915,371 @@ class RequestSequence(DefaultRequests):
         return self._request_sequence
 
 
+class RequestSequenceSweep():
+    ''' RequestSequence computed for a list of ClusterCosts on the same
+    CDF. The suffix sums are computed once and each cost is solved with
+    the lower envelope like RequestSequence (linear in the number of
+    values). With an increment limit (or a negative alpha) the envelope
+    does not apply: these costs are stacked on the first axis of the E
+    table and each row of the quadratic program is one vectorized step
+    over all of them '''
+
+    def __init__(self, discrete_values, cdf_values,
+                 cluster_costs, params=[0]):
+        assert (len(discrete_values) > 0), "Invalid input"
+        assert (len(discrete_values) == len(cdf_values)), "Invalid cdf"
+        assert (len(cluster_costs) > 0), "No cluster costs provided"
+
+        self.discret_values = discrete_values
+        self.upper_limit = np.max(self.discret_values)
+        self.makespan_increment_limit = params[0]
+        self._alpha = np.array([[c.alpha] for c in cluster_costs], dtype=float)
+        self._beta = np.array([[c.beta] for c in cluster_costs], dtype=float)
+        self._gamma = np.array([[c.gamma] for c in cluster_costs],
+                               dtype=float)
+
+        # same operations as DefaultRequests.get_discrete_sum_F and
+        # compute_FV so that the makespans are identical
+        values = np.asarray(discrete_values, dtype=float)
+        cdf = np.asarray(cdf_values, dtype=float)
+        f = np.diff(cdf, prepend=0) / cdf[-1]
+        self._sumF = np.zeros(len(values) + 1)
+        self._sumF[:-1] = np.cumsum(f[::-1])[::-1]
+        self._sumFV = np.cumsum(values * f)[-1]
+        self._values = values
+        self._E = None
+        self._request = None
+
+    def __compute_envelope(self, k):
+        # same lines as RequestSequence.compute_E_table_envelope
+        alpha = float(self._alpha[k, 0])
+        beta = float(self._beta[k, 0])
+        gamma = float(self._gamma[k, 0])
+        values = self._values.tolist()
+        sumF = self._sumF.tolist()
+        n = len(values)
+        E = [0.0] * (n + 1)
+        request = [0] * (n + 1)
+        E[n] = beta * self._sumFV
+        request[n] = n - 1
+        envelope = LowerEnvelope()
+        for i in range(n - 1, -1, -1):
+            vi = values[i]
+            envelope.add_line(alpha * vi + gamma, beta * vi * sumF[i + 1],
+                              E[i + 1], i)
+            request[i], E[i] = envelope.query(sumF[i])
+        self._E[k] = E
+        self._request[k] = request
+
+    def __compute_quadratic(self, costs):
+        n = len(self._values)
+        values = self._values
+        # makespan of request j from row i: A[j] * sumF[i] + B[j] + E[j + 1]
+        A = self._alpha[costs] * values + self._gamma[costs]
+        B = self._beta[costs] * values * self._sumF[1:]
+        E = np.empty((len(costs), n + 1))
+        request = np.empty((len(costs), n + 1), dtype=np.int64)
+        E[:, n] = self._beta[costs, 0] * self._sumFV
+        request[:, n] = n - 1
+        rows = np.arange(len(costs))
+        for i in range(n - 1, -1, -1):
+            makespan = A[:, i:] * self._sumF[i] + B[:, i:] + E[:, i + 1:]
+            if self.makespan_increment_limit > 0:
+                step = np.abs(values[i] - values[request[:, i + 1:]])
+                makespan[step < self.makespan_increment_limit] = np.inf
+            # the last request with the minimum makespan
+            last = makespan.shape[1] - 1 - np.argmin(makespan[:, ::-1],
+                                                     axis=1)
+            best = makespan[rows, last]
+            found = best < np.inf
+            # same entry as RequestSequence when no request is valid
+            E[:, i] = np.where(found, best, -1)
+            request[:, i] = np.where(found, i + last, -1)
+        self._E[costs] = E
+        self._request[costs] = request
+
+    def compute_E_table(self):
+        n = len(self._values)
+        m = len(self._alpha)
+        self._E = np.empty((m, n + 1))
+        self._request = np.empty((m, n + 1), dtype=np.int64)
+        # same conditions as RequestSequence.compute_E_table
+        envelope = self.makespan_increment_limit <= 0 and \
+            bool(np.all(np.diff(self._values) >= 0))
+        quadratic = []
+        for k in range(m):
+            if envelope and self._alpha[k, 0] >= 0:
+                self.__compute_envelope(k)
+            else:
+                quadratic.append(k)
+        if len(quadratic) > 0:
+            self.__compute_quadratic(np.array(quadratic))
+        return self._E[:, 0]
+
+    def get_expected_makespans(self):
+        ''' Expected makespan (E[0]) of the sequence of each cost '''
+        if self._E is None:
+            self.compute_E_table()
+        return self._E[:, 0]
+
+    def compute_request_sequences(self):
+        if self._E is None:
+            self.compute_E_table()
+        n = len(self.discret_values)
+        sequences = []
+        for request in self._request.tolist():
+            sequence = []
+            j = request[0]
+            while 0 <= j < n - 1:
+                sequence.append((self.discret_values[j], 0))
+                j = request[j + 1]
+            # entries without a valid request end with the largest value
+            j = j % n
+            if self.discret_values[j] != self.upper_limit:
+                sequence.append((self.discret_values[j], 0))
+                sequence.append((self.upper_limit, 0))
+            else:
+                sequence.append((self.discret_values[j], 0))
+            sequences.append(sequence)
+        return sequences
+
+
+class IncrementalRequestSequence(RequestSequence):
+    ''' RequestSequence that can be updated when new runs are added to the
+    history. The table is computed on the run counts instead of the
+    normalized CDF and without the beta * sumFV term of the last request
+    (they only scale and shift all the makespans), so a run added at index
+    k changes only E[i] for i <= k and only these entries are recomputed.
+    The entries are stored from the largest value down so that inserting a
+    new value does not move the entries above it '''
+
+    def __init__(self, discrete_values, counts,
+                 cluster_cost, params=[0]):
+        self._counts = list(counts)
+        self._rE = []
+        self._envelope = None
+        super().__init__(list(discrete_values),
+                         np.cumsum(self._counts).tolist(), cluster_cost,
+                         params=params)
+
+    def get_discrete_F(self):
+        return np.array(self._counts)
+
+    def get_discrete_sum_F(self):
+        # kept as a list, new values are inserted in place
+        return super().get_discrete_sum_F().tolist()
+
+    def compute_E_value(self, i):
+        if len(self._rE) == 0:
+            self.compute_E_table(i)
+        n = len(self.discret_values)
+        makespan, request = self._rE[n - i]
+        # makespan for the normalized CDF
+        return ((makespan + self._beta * self._sumFV) / self._sumF[0],
+                n - 1 - request, 0)
+
+    def compute_E_table(self, first):
+        assert (self.makespan_increment_limit <= 0 and
+                self.has_monotone_slopes()), \
+            "Incremental updates need an envelope computable table"
+        self._envelope = LowerEnvelope(keep_history=True)
+        self._rE = [(0, 0)]
+        self.__compute_rows(len(self.discret_values) - 1)
+
+    def __compute_rows(self, last):
+        # rows last, ..., 0; lines and requests are indexed from the end
+        n = len(self.discret_values)
+        for i in range(last, -1, -1):
+            vi = self.discret_values[i]
+            self._envelope.add_line(float(self._alpha * vi + self._gamma),
+                                    self._beta * vi * self._sumF[i + 1],
+                                    self._rE[n - i - 1][0], n - 1 - i)
+            request, makespan = self._envelope.query(self._sumF[i])
+            self._rE.append((makespan, request))
+
+    def add_values(self, values, weights=None):
+        ''' Add new runs (with optional weights) to the history and update
+        the E table '''
+        if weights is None:
+            values, counts = np.unique(values, return_counts=True)
+        else:
+            values, inverse = np.unique(values, return_inverse=True)
+            counts = np.bincount(inverse.ravel(), weights=np.asarray(
+                weights, dtype=float).ravel())
+        if len(values) == 0:
+            return
+        # values are added in increasing order so the previous indexes
+        # do not move; last is the largest index that changed
+        last = -1
+        for value, count in zip(values.tolist(), counts.tolist()):
+            k = bisect.bisect_left(self.discret_values, value)
+            if k == len(self.discret_values) or \
+               self.discret_values[k] != value:
+                self.discret_values.insert(k, value)
+                self._counts.insert(k, 0)
+                self._sumF.insert(k, self._sumF[k])
+            self._counts[k] += count
+            for i in range(k + 1):
+                self._sumF[i] += count
+            self._sumFV += value * count
+            last = k
+        self._cdf = np.cumsum(self._counts).tolist()
+        self.upper_limit = max(self.upper_limit, value)
+        self._request_sequence = []
+
+        # the lines and entries above last are unchanged
+        n = len(self.discret_values)
+        self._envelope.rollback(len(self._rE) - n + last)
+        del self._rE[n - last:]
+        self.__compute_rows(last)
+
+
+class DenseETable():
+    ''' Array backed E table used by the checkpointing sequences. The entry
+    (ic, il) is stored in a float64 plane for the makespan, an int32 plane
+    for the chosen request and an int8 plane for the checkpoint decision.
+    With diagonal=True only the (i, i) entries are stored '''
+
+    def __init__(self, size, diagonal=False):
+        self.diagonal = diagonal
+        shape = (size, ) if diagonal else (size, size)
+        self.value = np.full(shape, np.nan)
+        self.request = np.full(shape, -1, dtype=np.int32)
+        self.delta = np.zeros(shape, dtype=np.int8)
+
+    def __index(self, key):
+        if self.diagonal:
+            assert (key[0] == key[1]), "Only (i, i) entries are stored"
+            return key[0]
+        return key
+
+    def __contains__(self, key):
+        return not np.isnan(self.value[self.__index(key)])
+
+    def __getitem__(self, key):
+        idx = self.__index(key)
+        return (self.value[idx], int(self.request[idx]),
+                int(self.delta[idx]))
+
+    def __setitem__(self, key, val):
+        idx = self.__index(key)
+        self.value[idx], self.request[idx], self.delta[idx] = val
+
+    def __len__(self):
+        return int(np.count_nonzero(~np.isnan(self.value)))
+
+    @property
+    def nbytes(self):
+        return self.value.nbytes + self.request.nbytes + self.delta.nbytes
+
+
 class CheckpointSequence(DefaultRequests):
     ''' Sequence that optimizes the total makespan of a job when the
     application or system is capable of taking checkpoints '''
 
     def __init__(self, discrete_values, cdf_values,
-                 cluster_cost, params=[0]):
+                 cluster_cost, params=[0], monitor=None):
 
         super().__init__(discrete_values, cdf_values, cluster_cost,
-                         params=params)
+                         params=params, monitor=monitor)
         self.CR = cluster_cost.checkpoint_memory_model
+        self._values = np.asarray(self.discret_values, dtype=float)
+        self._sumF_array = np.asarray(self._sumF, dtype=float)
+        # checkpoint and restart costs for all the discrete values
+        self._C = np.asarray(cluster_cost.get_checkpoint_times(
+            self._values), dtype=float)
+        self._R = np.asarray(cluster_cost.get_restart_times(self._values),
+                             dtype=float)
+        self._E = self.init_E_table()
         E_val = self.compute_E_value((0, 0))
         self.__t1 = self.discret_values[E_val[1]]
         self.__makespan = E_val[0]
 
-    def makespan_init_value(self, ic, il, j, delta, R):
-        vic = self.discret_values[ic]
-        if R == 0:
-            vic = 0
+    def get_expected_makespan(self):
+        return self.__makespan
+
+    def init_E_table(self):
+        return DenseETable(len(self.discret_values))
 
-        C = self.CR.get_checkpoint_time(self.discret_values[j])
-        init = (self._alpha * (R + self.discret_values[j] - vic +
-                               delta * C) + self._beta * R + self._gamma) \
-            * self._sumF[il + 1]
-        init += self._beta * ((1 - delta) * (self.discret_values[j] - vic)
-                              + delta * C) * self._sumF[j + 1]
+    def makespan_init_value(self, il, j, delta, R, vic):
+        # vectorized over the array of requests j
+        vj = self._values[j]
+        C = self._C[j]
+        init = (self._alpha * (R + vj - vic + delta * C) +
+                self._beta * R + self._gamma) * self._sumF[il + 1]
+        init += self._beta * ((1 - delta) * (vj - vic) + delta * C) \
+            * self._sumF_array[j + 1]
         return init
 
-    def compute_E(self, ic, il, R):
-        min_makespan = -1
-        min_request = -1
-        for j in range(il, len(self.discret_values) - 1):
-            # makespan with checkpointing the last sequence (delta = 1)
-            makespan = self.makespan_init_value(ic, il, j, 1, R)
-            makespan += self._E[(j + 1, j + 1)][0]
-            next_j = self._E[(j + 1, j + 1)][1]
-            if self.update_best_makespan(makespan, min_makespan, il, next_j):
-                min_makespan = makespan
-                min_request = j
-                min_delta = 1
-
-            # makespan without checkpointing the last sequence (delta = 0)
-            makespan = self.makespan_init_value(ic, il, j, 0, R)
-            makespan += self._E[(ic, j + 1)][0]
-            next_j = self._E[(ic, j + 1)][1]
-            if self.update_best_makespan(makespan, min_makespan, il, next_j):
-                min_makespan = makespan
-                min_request = j
-                min_delta = 0
-
-        self._E[(ic, il)] = (min_makespan, min_request, min_delta)
+    def select_best_makespan(self, il, makespan, next_j):
+        ''' Vectorized update_best_makespan over the last axis: invalid
+        candidates are dropped and the last minimal one is chosen.
+        Returns the makespan and position (inf and -1 if none is valid) '''
+        if self.makespan_increment_limit > 0:
+            step = np.abs(self._values[il] - self._values[next_j])
+            makespan = np.where(step < self.makespan_increment_limit,
+                                np.inf, makespan)
+        last = makespan.shape[-1] - 1 - np.argmin(
+            makespan[..., ::-1], axis=-1)
+        best = np.take_along_axis(
+            makespan, np.expand_dims(last, -1), axis=-1)[..., 0]
+        return best, np.where(best == np.inf, -1, last)
+
+    def compute_E(self, il, R):
+        ''' Compute E[(ic, il)] for all ic <= il at once. All the states
+        pay the restart cost R except ic = 0 (nothing checkpointed yet).
+        The makespan is split in a term that only depends on ic, one that
+        only depends on the request j and one depending on both '''
+        n = len(self.discret_values)
+        j = np.arange(il, n - 1)
+        vj = self._values[j]
+        C = self._C[j]
+        sumF_il = self._sumF[il + 1]
+        sumF_j = self._sumF_array[j + 1]
+        R = np.full(il + 1, R, dtype=float)
+        R[0] = 0
+        vic = np.where(R != 0, self._values[:il + 1], 0)
+        state_cost = (self._alpha * (R - vic) + self._beta * R +
+                      self._gamma) * sumF_il
+
+        # makespan with checkpointing the last sequence (delta = 1) does
+        # not depend on ic, the best request is the same for all states
+        makespan = self._alpha * (vj + C) * sumF_il + \
+            self._beta * C * sumF_j + self._E.value[j + 1, j + 1]
+        best, pos = self.select_best_makespan(
+            il, makespan, self._E.request[j + 1, j + 1])
+        with_checkpoint = state_cost + best
+
+        # makespan without checkpointing the last sequence (delta = 0)
+        makespan = np.multiply.outer(-self._beta * vic, sumF_j)
+        makespan += self._alpha * vj * sumF_il + self._beta * vj * sumF_j
+        makespan += self._E.value[:il + 1, il + 1:]
+        best, pos_no = self.select_best_makespan(
+            il, makespan, self._E.request[:il + 1, il + 1:])
+        no_checkpoint = state_cost + best
+
+        # for equal makespans keep the candidate tried last, the request j
+        # with checkpoint is tried before the same j without checkpoint
+        delta = (with_checkpoint < no_checkpoint) | (
+            (with_checkpoint == no_checkpoint) & (pos > pos_no))
+        min_makespan = np.where(delta, with_checkpoint, no_checkpoint)
+        min_request = np.where(delta, pos, pos_no)
+        found = min_makespan != np.inf
+        self._E.value[:il + 1, il] = np.where(found, min_makespan, -1)
+        self._E.request[:il + 1, il] = np.where(found, il + min_request, -1)
+        self._E.delta[:il + 1, il] = np.where(found, delta, 0)
 
     def compute_E_table(self, first):
-        for ic in range(len(self.discret_values) - 1, -1, -1):
-            self._E[(ic, len(self.discret_values) - 1)] = (
-                self._beta * self._sumFV, len(self.discret_values) - 1, 0)
+        last = len(self.discret_values) - 1
+        self._E.value[:, last] = self._beta * self._sumFV
+        self._E.request[:, last] = last
+        self._E.delta[:, last] = 0
 
         for il in range(len(self.discret_values) - 2, -1, -1):
-            for ic in range(il, 0, -1):
-                if (ic, il) in self._E:
-                    continue
-                R = self.CR.get_restart_time(self.discret_values[il])
-                self.compute_E(ic, il, R)
-            self.compute_E(0, il, 0)
+            R = self._R[il]
+            self.compute_E(il, R)
+            self.report_rows(len(self.discret_values) - 1 - il,
+                             len(self.discret_values) - 1)
 
         return self._E[first]
 
@@ -774,18 +2311,23 @@ class AllCheckpointSequence(CheckpointSequence):
     the application or system to take checkpoints at the end of each
     reservation '''
 
+    def init_E_table(self):
+        # only the (i, i) entries are used, including (n, n)
+        return DenseETable(len(self.discret_values) + 1, diagonal=True)
+
     def compute_E(self, i, R):
-        min_makespan = -1
-        min_request = -1
-        for j in range(i, len(self.discret_values)):
-            makespan = self.makespan_init_value(i, i, j, 1, R)
-            makespan += self._E[(j + 1, j + 1)][0]
-            next_j = self._E[(j + 1, j + 1)][1]
-            if self.update_best_makespan(makespan, min_makespan, i, next_j):
-                min_makespan = makespan
-                min_request = j
-
-        self._E[(i, i)] = (min_makespan, min_request, 1)
+        vic = self.discret_values[i]
+        if R == 0:
+            vic = 0
+        j = np.arange(i, len(self.discret_values))
+        makespan = self.makespan_init_value(i, j, 1, R, vic)
+        makespan += self._E.value[j + 1]
+        next_j = self._E.request[j + 1]
+        min_makespan, pos = self.select_best_makespan(i, makespan, next_j)
+        if pos == -1:
+            self._E[(i, i)] = (-1, -1, 1)
+            return
+        self._E[(i, i)] = (min_makespan, i + pos, 1)
 
     def compute_E_table(self, first):
         # the last reservation will not have to take a checkpoint
@@ -795,8 +2337,10 @@ class AllCheckpointSequence(CheckpointSequence):
         for i in range(len(self.discret_values) - 1, 0, -1):
             if (i, i) in self._E:
                 continue
-            R = self.CR.get_restart_time(self.discret_values[i])
+            R = self._R[i]
             self.compute_E(i, R)
+            self.report_rows(len(self.discret_values) - i,
+                             len(self.discret_values))
         self.compute_E(0, 0)
 
         return self._E[first]
@@ -807,6 +2351,76 @@ class AllCheckpointSequence(CheckpointSequence):
 # -------------
 
 
+class DenseLimitedTable():
+    ''' Array backed E table used by LimitedSequence. The entries with k
+    submissions left are stored in column k of a float64 plane for the
+    makespan (nan for the entries never computed), an int32 plane for the
+    chosen request and an int8 plane for the checkpoint decision. The ic
+    axis is only kept for AdaptiveCheckpoint where only the states
+    ic <= il exist: the row il (ic and il start from -1) holds il + 2
+    states and the table has (n + 1)(n + 2) / 2 rows for n values. The
+    other strategies only use the states ic = -1 (NeverCheckpoint) or
+    ic = il (AlwaysCheckpoint) and store one row per il.
+
+    The footprint is 13 bytes per entry times the depth (submission limit
+    + 1, or limit * 10 + 1 for the AverageBased strategy): n = 300 with an
+    average limit of 5 and AdaptiveCheckpoint takes about 30MB '''
+
+    def __init__(self, size, depth, CR_strategy):
+        self.full = (CR_strategy == CRStrategy.AdaptiveCheckpoint)
+        self.always = (CR_strategy == CRStrategy.AlwaysCheckpoint)
+        rows = (size + 1) * (size + 2) // 2 if self.full else size + 1
+        self.value = np.full((rows, depth), np.nan)
+        self.request = np.full((rows, depth), -1, dtype=np.int32)
+        self.delta = np.zeros((rows, depth), dtype=np.int8)
+
+    def index(self, ic, il, k):
+        ''' Index of the entries (works on arrays of states) '''
+        if self.full:
+            return ((il + 1) * (il + 2) // 2 + ic + 1, k)
+        return (il + 1, k)
+
+    def __contains__(self, key):
+        ic, il, k = key
+        if k < 0 or ic > il:
+            return False
+        # the rows of the other strategies only hold one state
+        if not self.full and ic != (il if self.always else -1):
+            return False
+        return not np.isnan(self.value[self.index(*key)])
+
+    def __getitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        idx = self.index(*key)
+        return (self.value[idx], int(self.request[idx]),
+                int(self.delta[idx]))
+
+    def __setitem__(self, key, val):
+        idx = self.index(*key)
+        self.value[idx], self.request[idx], self.delta[idx] = val
+
+    def get_entries(self, ic, il, k):
+        ''' Makespans and requests of the entries (arrays of states), like
+        __getitem__ raises KeyError if one was never computed '''
+        idx = self.index(ic, il, k)
+        value = self.value[idx]
+        missing = np.isnan(value)
+        if missing.any():
+            first = np.argwhere(missing)[0]
+            key = [np.broadcast_to(i, missing.shape)[tuple(first)]
+                   for i in (ic, il, k)]
+            raise KeyError(tuple(int(i) for i in key))
+        return value, self.request[idx]
+
+    def __len__(self):
+        return int(np.count_nonzero(~np.isnan(self.value)))
+
+    @property
+    def nbytes(self):
+        return self.value.nbytes + self.request.nbytes + self.delta.nbytes
+
+
 class LimitedSequence(DefaultRequests):
     ''' Sequence that optimizes the total makespan of a job using a
     maxim number of submissions (the checkpoint strategy can be
@@ -814,12 +2428,11 @@ class LimitedSequence(DefaultRequests):
     can either be ThBased or AvgBased '''
 
     def __init__(self, discrete_values, cdf_values,
-                 cluster_cost, params=[]):
+                 cluster_cost, params=[], monitor=None):
 
         super(LimitedSequence, self).__init__(
             discrete_values, cdf_values, cluster_cost,
-            params=[params[3]])
-        self._E_index = {}
+            params=[params[3]], monitor=monitor)
 
         assert (len(params) > 3), "Not enough parameters provided"
         self.threshold = params[2]
@@ -828,189 +2441,307 @@ class LimitedSequence(DefaultRequests):
         self.th_strategy = params[1]
         self.CRstrategy = params[0]
         self.CR = cluster_cost.checkpoint_memory_model
+        self._values = np.asarray(self.discret_values, dtype=float)
+        self._sumF_array = np.asarray(self._sumF, dtype=float)
+        # checkpoint and restart costs for all the discrete values
+        self._C = np.asarray(cluster_cost.get_checkpoint_times(
+            self._values), dtype=float)
+        self._R = np.asarray(cluster_cost.get_restart_times(self._values),
+                             dtype=float)
         if self.threshold == 1:
+            # a limit of 1.0 (float or numpy) becomes the int index of the
+            # entry traced by trace_request_sequence
+            self.threshold = int(self.threshold)
             E_val = (1, len(self.discret_values) - 1, 0)
-            self._E[(-1, -1)] = []
-            self._E[(-1, -1)].append(E_val)
-            self._E_index[(-1, -1)] = {1: 0}
+            self._E = DenseLimitedTable(len(self.discret_values), 2,
+                                        self.CRstrategy)
+            self._E[(-1, -1, 1)] = E_val
         else:
             if self.th_strategy == LimitStrategy.ThresholdBased:
                 self.threshold = int(np.floor(self.threshold))
+                self._E = DenseLimitedTable(len(self.discret_values),
+                                            self.threshold + 1,
+                                            self.CRstrategy)
                 E_val = self.compute_E_threshold()
             else:
                 self.threshold = int(
                     round(self.threshold * self.th_precision))
+                self._E = DenseLimitedTable(len(self.discret_values),
+                                            self.threshold + 1,
+                                            self.CRstrategy)
                 E_val = self.compute_E_average()
         self.__t1 = self.discret_values[E_val[1]]
         self.__makespan = E_val[0]
 
-    def makespan_with_checkpoint(self, ic, il, j, restart_cost):
-        vic = self.discret_values[ic]
-        if restart_cost == 0:
-            vic = 0
+    def get_expected_makespan(self):
+        return self.__makespan
 
-        C = self.CR.get_checkpoint_time(self.discret_values[j])
-        cost = self._alpha * (restart_cost + C + self.discret_values[j] - vic)
+    def makespan_with_checkpoint(self, ic, il, j, restart_cost):
+        # vectorized over the states (ic, restart_cost) on the first axis
+        # and the requests j on the last one
+        vic = np.where(restart_cost == 0, 0, self._values[ic])
+        C = self._C[j]
+        cost = self._alpha * (restart_cost + C + self._values[j] - vic)
         cost = (cost + self._gamma) * self._sumF[il + 1]
-        cost += self._beta * C * self._sumF[j + 1]
+        cost += self._beta * C * self._sumF_array[j + 1]
         return cost
 
     def makespan_no_checkpoint(self, ic, il, j, restart_cost):
-        vic = self.discret_values[ic]
-        if restart_cost == 0:
-            vic = 0
-
-        C = self.CR.get_checkpoint_time(self.discret_values[j])
-        cost = self._alpha * (restart_cost + self.discret_values[j] - vic)
+        vic = np.where(restart_cost == 0, 0, self._values[ic])
+        cost = self._alpha * (restart_cost + self._values[j] - vic)
         cost = (cost + self._gamma) * self._sumF[il + 1]
-        cost += self._beta * self._sumF[j + 1] * \
-                (self.discret_values[j] - vic)
+        cost += self._beta * self._sumF_array[j + 1] * \
+                (self._values[j] - vic)
         return cost
 
-    def add_element_in_E(self, reservation, val, k):
-        idx = -1
-        if reservation not in self._E:
-            self._E[reservation] = []
-            self._E_index[reservation] = {}
-        if val not in self._E[reservation]:
-            self._E[reservation].append(val)
-            self._E_index[reservation][k] = len(self._E[reservation]) - 1
-        else:
-            idx = [i for i in range(len(self._E[reservation]))
-                   if val == self._E[reservation][i]][0]
-            self._E_index[reservation][k] = idx
+    def select_best_makespan(self, il, makespan, next_j):
+        ''' Vectorized update_best_makespan over the requests (last axis),
+        the last minimal makespan is chosen. Returns the makespan and its
+        position (inf and -1 if no request is valid) '''
+        if self.makespan_increment_limit > 0:
+            step = np.abs(self._values[il] - self._values[next_j])
+            makespan = np.where(step < self.makespan_increment_limit,
+                                np.inf, makespan)
+        last = makespan.shape[-1] - 1 - np.argmin(makespan[:, ::-1],
+                                                  axis=-1)
+        best = makespan[np.arange(len(makespan)), last]
+        return best, np.where(best == np.inf, -1, last)
 
     def compute_E(self, ic, il, R, k):
-        min_makespan = np.inf
-        min_request = -1
-        min_delta = 0
-        th_next = k - 1
-        for j in range(il + 1, len(self.discret_values)):
-            if self.th_strategy == LimitStrategy.AverageBased:
-                th_next = k - int(round(
-                    self._sumF[j + 1] * self.th_precision))
-            # we cannot exceed the threshold number of submission
-            if th_next < 0:
-                continue
-            # makespan with checkpointing the last sequence (delta = 1)
-            if self.CRstrategy != CRStrategy.NeverCheckpoint:
-                makespan = self.makespan_with_checkpoint(ic, il, j, R)
-                idx = self._E_index[(j, j)][th_next]
-                makespan += self._E[(j, j)][idx][0]
-                next_j = self._E[(j, j)][idx][1]
-                if self.update_best_makespan(
-                    makespan, min_makespan, il, next_j):
-                    min_makespan = makespan
-                    min_request = j
-                    min_delta = 1
-
-            # makespan without checkpointing the last sequence (delta = 0)
-            if self.CRstrategy != CRStrategy.AlwaysCheckpoint:
-                makespan = self.makespan_no_checkpoint(ic, il, j, R)
-                idx = self._E_index[(ic, j)][th_next]
-                makespan += self._E[(ic, j)][idx][0]
-                next_j = self._E[(ic, j)][idx][1]
-                if self.update_best_makespan(
-                    makespan, min_makespan, il, next_j):
-                    min_makespan = makespan
-                    min_request = j
-                    min_delta = 0
-
-        self.add_element_in_E(
-            (ic, il), (min_makespan, min_request, min_delta), k)
+        ''' Compute E[(ic, il)] with k submissions left for the array of
+        states ic (with restart costs R), vectorized over the requests '''
+        n = len(self.discret_values)
+        j = np.arange(il + 1, n)
+        if self.th_strategy == LimitStrategy.AverageBased:
+            th_next = k - np.round(
+                self._sumF_array[j + 1] * self.th_precision).astype(int)
+        else:
+            th_next = np.full(len(j), k - 1)
+        # we cannot exceed the threshold number of submission
+        j = j[th_next >= 0]
+        th_next = th_next[th_next >= 0]
+        states = np.full(len(ic), il)
+        if len(j) == 0:
+            self._E[(ic, states, k)] = (np.inf, -1, 0)
+            return
+        ic = ic[:, np.newaxis]
+        R = R[:, np.newaxis]
+
+        # makespan with checkpointing the last sequence (delta = 1)
+        with_checkpoint = np.full(len(ic), np.inf)
+        pos = np.full(len(ic), -1)
+        if self.CRstrategy != CRStrategy.NeverCheckpoint:
+            value, next_j = self._E.get_entries(j, j, th_next)
+            makespan = self.makespan_with_checkpoint(ic, il, j, R)
+            makespan = makespan + value
+            with_checkpoint, pos = self.select_best_makespan(
+                il, makespan, next_j)
+
+        # makespan without checkpointing the last sequence (delta = 0)
+        no_checkpoint = np.full(len(ic), np.inf)
+        pos_no = np.full(len(ic), -1)
+        if self.CRstrategy != CRStrategy.AlwaysCheckpoint:
+            value, next_j = self._E.get_entries(ic, j, th_next)
+            makespan = self.makespan_no_checkpoint(ic, il, j, R)
+            makespan = makespan + value
+            next_j = np.broadcast_to(next_j, makespan.shape)
+            no_checkpoint, pos_no = self.select_best_makespan(
+                il, makespan, next_j)
+
+        # for equal makespans keep the candidate tried last, the request j
+        # with checkpoint is tried before the same j without checkpoint
+        delta = (with_checkpoint < no_checkpoint) | (
+            (with_checkpoint == no_checkpoint) & (pos > pos_no))
+        min_makespan = np.where(delta, with_checkpoint, no_checkpoint)
+        min_pos = np.where(delta, pos, pos_no)
+        found = min_pos != -1
+        self._E[(ic[:, 0], states, k)] = (
+            min_makespan, np.where(found, j[min_pos], -1),
+            np.where(found, delta, 0))
+
+    def get_states(self, il, R):
+        ''' States ic (and their restart cost) computed for the row il '''
+        if self.CRstrategy == CRStrategy.AdaptiveCheckpoint:
+            ic = np.arange(il, -2, -1)
+            R = np.where(ic == -1, 0, R)
+        elif self.CRstrategy == CRStrategy.AlwaysCheckpoint:
+            ic = np.array([il])
+        else:
+            ic = np.array([-1])
+            R = 0
+        return ic, np.full(len(ic), R, dtype=float)
+
+    def initialize_E(self, il, first_k):
+        # the states with more than first_k submissions left finish
+        # with the last value
+        ic, _ = self.get_states(il, 0)
+        k = np.arange(first_k, self.threshold + 1)
+        idx = self._E.index(ic[:, np.newaxis], il, k)
+        self._E.value[idx] = self._beta * self._sumFV
+        self._E.request[idx] = len(self.discret_values) - 2
+        self._E.delta[idx] = 0
 
     def initialize_threshold_E(self):
         th = self.threshold
-        for k in range(max(0, th - len(self.discret_values)), th + 1):
-            if self.CRstrategy == CRStrategy.AdaptiveCheckpoint:
-                for ic in range(len(self.discret_values) - 1, -2, -1):
-                    idx = (ic, len(self.discret_values) - 1)
-                    self.add_element_in_E(
-                        idx, (self._beta * self._sumFV,
-                              len(self.discret_values) - 2, 0), k)
-            if self.CRstrategy == CRStrategy.AlwaysCheckpoint:
-                idx = (len(self.discret_values) - 1,
-                       len(self.discret_values) - 1)
-                self.add_element_in_E(
-                    idx, (self._beta * self._sumFV,
-                          len(self.discret_values) - 2, 0), k)
-            if self.CRstrategy == CRStrategy.NeverCheckpoint:
-                idx = (-1, len(self.discret_values) - 1)
-                self.add_element_in_E(
-                    idx, (self._beta * self._sumFV,
-                          len(self.discret_values) - 2, 0), k)
+        self.initialize_E(len(self.discret_values) - 1,
+                          max(0, th - len(self.discret_values)))
 
     def compute_E_threshold(self):
         th = self.threshold
         self.initialize_threshold_E()
         for il in range(len(self.discret_values) - 2, -1, -1):
-            R = self.CR.get_restart_time(self.discret_values[il])
+            R = self._R[il]
+            ic, R = self.get_states(il, R)
             for k in range(max(0, th - il - 1), th + 1):
-                if self.CRstrategy == CRStrategy.AdaptiveCheckpoint:
-                    for ic in range(il, -1, -1):
-                        if (ic, il) in self._E and k in self._E_index[(ic, il)]:
-                            continue
-                        self.compute_E(ic, il, R, k)
-                if self.CRstrategy == CRStrategy.AlwaysCheckpoint:
-                    if (il, il) in self._E and k in self._E_index[(il, il)]:
-                        continue
-                    self.compute_E(il, il, R, k)
-                if self.CRstrategy != CRStrategy.AlwaysCheckpoint:
-                    if (-1, il) in self._E and k in self._E_index[(-1, il)]:
-                        continue
-                    self.compute_E(-1, il, 0, k)
-
-        self.compute_E(-1, -1, 0, th)
-        idx = self._E_index[(-1, -1)][th]
-        return self._E[(-1, -1)][idx]
+                self.compute_E(ic, il, R, k)
+            self.report_rows(len(self.discret_values) - 1 - il,
+                             len(self.discret_values) - 1)
+
+        self.compute_E(np.array([-1]), -1, np.zeros(1), th)
+        return self._E[(-1, -1, th)]
+
+    def compute_frontier(self):
+        ''' Sequences for every submission limit k from 1 to the threshold
+        using the same table: the entries do not depend on the threshold,
+        only the ones needed for the smaller limits are added. Returns the
+        list of (k, sequence, expected makespan, average submissions) '''
+        assert (self.th_strategy == LimitStrategy.ThresholdBased), \
+            "The frontier is only available for the threshold strategy"
+        th = self.threshold
+        self.initialize_E(len(self.discret_values) - 1, 0)
+        for il in range(len(self.discret_values) - 2, -1, -1):
+            R = self._R[il]
+            ic, R = self.get_states(il, R)
+            for k in range(0, th + 1):
+                if (ic[0], il, k) not in self._E:
+                    self.compute_E(ic, il, R, k)
+            self.report_rows(len(self.discret_values) - 1 - il,
+                             len(self.discret_values) - 1)
+
+        frontier = []
+        for k in range(1, th + 1):
+            self.compute_E(np.array([-1]), -1, np.zeros(1), k)
+            sequence, index_sequence = self.trace_request_sequence(k)
+            frontier.append((k, sequence, self._E[(-1, -1, k)][0],
+                             self.check_avegage_submissions(index_sequence)))
+        return frontier
+
+    def get_average_start(self, il):
+        return int(round(self._sumF[il + 1] * self.threshold * \
+                         (len(self.discret_values) - il)))
 
     def initialize_average_E(self):
-        th = self.threshold
         for il in range(len(self.discret_values) - 1, -1, -1):
-            startk = int(round(self._sumF[il + 1] * th * \
-                           (len(self.discret_values) - il)))
-            for k in range(startk, th + 1):
-                if self.CRstrategy == CRStrategy.AdaptiveCheckpoint:
-                    for ic in range(il, -2, -1):
-                        self.add_element_in_E(
-                            (ic, il), (self._beta * self._sumFV,
-                                       len(self.discret_values) - 2, 0), k)
-                if self.CRstrategy == CRStrategy.AlwaysCheckpoint:
-                    self.add_element_in_E(
-                        (il, il), (self._beta * self._sumFV,
-                                   len(self.discret_values) - 2, 0), k)
-                if self.CRstrategy == CRStrategy.NeverCheckpoint:
-                    self.add_element_in_E(
-                        (-1, il), (self._beta * self._sumFV,
-                                  len(self.discret_values) - 2, 0), k)
+            self.initialize_E(il, self.get_average_start(il))
 
     def compute_E_average(self):
         th = self.threshold
         self.initialize_average_E()
         for il in range(len(self.discret_values) - 2, -1, -1):
-            endk = min(th, int(round(self._sumF[il + 1] * th * \
-                             (len(self.discret_values) - il)))) + 1
-            R = self.CR.get_restart_time(self.discret_values[il])
-            if self.CRstrategy == CRStrategy.AdaptiveCheckpoint:
-                for ic in range(il, -1, -1):
-                    for k in range(0, endk):
-                        if (ic, il) in self._E and k in self._E_index[(ic, il)]:
-                            continue
-                        self.compute_E(ic, il, R, k)
-            if self.CRstrategy == CRStrategy.AlwaysCheckpoint:
-                for k in range(0, endk):
-                    if (il, il) in self._E and k in self._E_index[(il, il)]:
-                        continue
-                    self.compute_E(il, il, R, k)
-            if self.CRstrategy != CRStrategy.AlwaysCheckpoint:
-                for k in range(0, endk):
-                    if (-1, il) in self._E and k in self._E_index[(-1, il)]:
-                        continue
-                    self.compute_E(-1, il, 0, k)
-
-        self.compute_E(-1, -1, 0, th)
-        idx = self._E_index[(-1, -1)][th]
-        return self._E[(-1, -1)][idx]
+            # the entries from the start k are initialized
+            endk = min(th + 1, self.get_average_start(il))
+            R = self._R[il]
+            ic, R = self.get_states(il, R)
+            for k in range(0, endk):
+                self.compute_E(ic, il, R, k)
+            self.report_rows(len(self.discret_values) - 1 - il,
+                             len(self.discret_values) - 1)
+
+        self.compute_E(np.array([-1]), -1, np.zeros(1), th)
+        return self._E[(-1, -1, th)]
+
+
+class MultiResolutionSolver():
+    ''' Coarse to fine solver for the sequences with a high complexity in
+    the number of discrete values (CheckpointSequence, LimitedSequence).
+    The sequence is computed on a coarse grid (InterpolationModel
+    discretize_data) and then recomputed on the grid refined with at most
+    window values of the full discretization around each chosen request,
+    until the sequence does not change. The CDF of a grid rounds the
+    values up to the next grid point, the difference between the expected
+    makespan on the coarse and on the final grid tells how much the coarse
+    discretization was off '''
+
+    def __init__(self, sequence_type, params, coarse_size=50, window=10,
+                 max_iterations=10):
+        assert (coarse_size > 2), "The coarse grid needs at least 3 points"
+        self.sequence_type = sequence_type
+        self.params = params
+        self.coarse_size = coarse_size
+        self.window = window
+        self.max_iterations = max_iterations
+        self.handler = None
+        self.report = {}
+        # optional SolveMonitor, checked at each refinement
+        self.monitor = None
+
+    def get_grid_cdf(self, grid):
+        # the cdf of the full discretization is a step function
+        idx = np.searchsorted(self._values, grid, side='right') - 1
+        return np.where(idx >= 0, self._cdf[np.maximum(idx, 0)], 0)
+
+    def get_requests(self, sequence):
+        # absolute request times (sequences are relative to the last
+        # checkpoint)
+        requests = []
+        already_compute = 0
+        for request in sequence:
+            requests.append(request[0] + already_compute)
+            if request[1] == 1:
+                already_compute = requests[-1]
+        return requests
+
+    def refine_grid(self, grid, sequence):
+        new_points = [grid]
+        for request in self.get_requests(sequence):
+            pos = np.searchsorted(grid, request)
+            low = grid[max(pos - 1, 0)]
+            high = grid[min(pos + 1, len(grid) - 1)]
+            first = np.searchsorted(self._values, low, side='right')
+            last = np.searchsorted(self._values, high, side='left')
+            if last <= first:
+                continue
+            idx = np.unique(np.linspace(first, last - 1, self.window,
+                                        dtype=int))
+            new_points.append(self._values[idx])
+        return np.unique(np.concatenate(new_points))
+
+    def solve(self, discrete_values, cdf_values, cluster_cost):
+        ''' Returns the sequence computed on the refined grid. The report
+        contains the grid sizes, the expected makespan on the coarse and on
+        the final grid and the relative gap between them '''
+        self._values = np.asarray(discrete_values, dtype=float)
+        self._cdf = np.asarray(cdf_values, dtype=float)
+        self._cdf = self._cdf / self._cdf[-1]
+
+        grid = InterpolationModel().discretize_data(
+            self._values, self.coarse_size - 1)
+        sequence = None
+        grid_sizes = []
+        for iteration in range(self.max_iterations):
+            if self.monitor is not None:
+                self.monitor.check()
+            self.handler = self.sequence_type(
+                grid, self.get_grid_cdf(grid), cluster_cost,
+                params=self.params)
+            new_sequence = self.handler.compute_request_sequence()
+            grid_sizes.append(len(grid))
+            if sequence is None:
+                coarse_cost = self.handler.get_expected_makespan()
+            new_grid = self.refine_grid(grid, new_sequence)
+            stable = (new_sequence == sequence and
+                      len(new_grid) == len(grid))
+            sequence = new_sequence
+            if stable:
+                break
+            grid = new_grid
+
+        cost = self.handler.get_expected_makespan()
+        self.report = {"iterations": len(grid_sizes),
+                       "grid_sizes": grid_sizes,
+                       "coarse_cost": coarse_cost, "cost": cost,
+                       "gap": (coarse_cost - cost) / coarse_cost}
+        return sequence
 
 
 # -------------
@@ -1032,25 +2763,51 @@ class LogDataCost(SequenceCost):
             self.sequence = [(i, 0) for i in sequence]
         else:
             self.sequence = sequence
-
-    def __compute_instance_cost(self, time, cluster_cost):
-        cost = 0
-        compute_time = 0
+        self._reservations = np.array([i[0] for i in self.sequence],
+                                      dtype=float)
+        checkpoint = np.array([i[1] == 1 for i in self.sequence])
+        # compute time already saved when each reservation starts
+        saved = np.where(checkpoint, self._reservations, 0)
+        self._offsets = np.concatenate(([0], np.cumsum(saved)[:-1]))
+        # a job of length t finishes in the first reservation covering t
+        self._covered = np.maximum.accumulate(
+            self._offsets + self._reservations)
+
+    def compute_instance_cost(self, data, cluster_cost):
+        ''' Returns the cost and the number of submissions needed by each
+        instance in data '''
+        data = np.asarray(data, dtype=float)
+        reservations = self._reservations
+        k = np.searchsorted(self._covered, data, side='left')
         # cost of reservation: alpha * t + beta min(t, reservation) + gamma
-        for reservation in self.sequence:
-            cost += cluster_cost.alpha * reservation[0]
-            cost += cluster_cost.beta * (
-                min(time - compute_time, reservation[0]))
-            cost += cluster_cost.gamma
-            # stop when the reservation is bigger than the execution time
-            if compute_time + reservation[0] >= time:
-                break
-            if reservation[1] == 1:
-                compute_time += reservation[0]
-        return cost
-
-    def compute_cost(self, data, cluster_cost):
-        cost = 0
-        for instance in data:
-            cost += self.__compute_instance_cost(instance, cluster_cost)
-        return cost / len(data)
+        # all the reservations before k fail and are used entirely
+        failed = (cluster_cost.alpha + cluster_cost.beta) * reservations + \
+            cluster_cost.gamma
+        cost = np.concatenate(([0], np.cumsum(failed)))[k]
+        # instances longer than the sequence fail all reservations
+        success = k < len(reservations)
+        ks = k[success]
+        cost[success] += cluster_cost.alpha * reservations[ks] + \
+            cluster_cost.beta * (data[success] - self._offsets[ks]) + \
+            cluster_cost.gamma
+        return cost, np.minimum(k + 1, len(reservations))
+
+    def compute_cost(self, data, cluster_cost, weights=None):
+        # with weights data is an histogram of the runs
+        cost, _ = self.compute_instance_cost(data, cluster_cost)
+        if weights is not None:
+            return np.average(cost, weights=weights)
+        return np.sum(cost) / len(data)
+
+    @staticmethod
+    def compute_cost_matrix(sequences, data, cluster_cost):
+        ''' Cost and number of submissions for every (sequence, instance)
+        pair. The mean cost of each sequence is cost.mean(axis=1) '''
+        data = np.asarray(data, dtype=float)
+        cost = np.empty((len(sequences), len(data)))
+        submissions = np.empty((len(sequences), len(data)), dtype=int)
+        for i in range(len(sequences)):
+            handler = LogDataCost(sequences[i])
+            cost[i], submissions[i] = handler.compute_instance_cost(
+                data, cluster_cost)
+        return cost, submissions
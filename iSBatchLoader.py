@@ -0,0 +1,248 @@
+import numpy as np
+import csv
+import json
+import os
+import tempfile
+import warnings
+import iSBatch as rqs
+
+
+class LogLoader():
+    ''' Loader for the logs of past runs given to the ResourceEstimator.
+    Text logs are parsed in chunks of chunk_size bytes and the result is
+    stored in a sidecar .npy cache (next to the log or in cache_dir). Later
+    loads memory map the cache as long as the size and modification time
+    of the log did not change. With a single column (usecols) the mapped
+    array is contiguous and is used by the ResourceEstimator without copy
+
+    Example: LogLoader().load("examples/logs/CT_eye_segmentation.log") '''
+
+    def __init__(self, delimiter=' ', usecols=None, chunk_size=1 << 24,
+                 cache=True, cache_dir=None):
+        assert (chunk_size > 0), "Invalid chunk size"
+        self.delimiter = delimiter
+        self.usecols = usecols
+        self.chunk_size = chunk_size
+        self.cache = cache
+        self.cache_dir = cache_dir
+
+    def get_cache_name(self, file_name):
+        if self.cache_dir is None:
+            return file_name + ".npy"
+        return os.path.join(self.cache_dir,
+                            os.path.basename(file_name) + ".npy")
+
+    def __description(self, file_name):
+        # the cache is valid only for the same log and parsing options
+        stat = os.stat(file_name)
+        usecols = self.usecols
+        if usecols is not None and not isinstance(usecols, int):
+            usecols = list(usecols)
+        return {"size": stat.st_size, "mtime": stat.st_mtime_ns,
+                "delimiter": self.delimiter, "usecols": usecols}
+
+    def __read_cache(self, file_name):
+        cache_name = self.get_cache_name(file_name)
+        try:
+            with open(cache_name + ".json") as fp:
+                description = json.load(fp)
+            if description != self.__description(file_name):
+                return None
+            return np.load(cache_name, mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+
+    def __write_cache(self, file_name, data, description):
+        cache_name = self.get_cache_name(file_name)
+        path = os.path.dirname(os.path.abspath(cache_name))
+        # the array is written before its description, both are renamed
+        # so that readers never see a partially written cache
+        for name, write in [
+                (cache_name, lambda fp: np.save(fp, data)),
+                (cache_name + ".json", lambda fp: fp.write(
+                    json.dumps(description).encode()))]:
+            tmp_name = None
+            try:
+                fd, tmp_name = tempfile.mkstemp(dir=path, suffix=".tmp")
+                with os.fdopen(fd, "wb") as fp:
+                    write(fp)
+                os.replace(tmp_name, name)
+            except OSError:
+                if tmp_name is not None and os.path.exists(tmp_name):
+                    os.remove(tmp_name)
+                return
+
+    def __parse_block(self, block):
+        # fast path for one value per line separated by white spaces
+        if self.delimiter in [' ', None] and self.usecols in [None, 0]:
+            values = block.split()
+            lines = block.count(b'\n') + (not block.endswith(b'\n'))
+            if len(values) == lines:
+                return np.array(values, dtype=float).reshape(-1, 1)
+        with warnings.catch_warnings():
+            # blocks with only comments are empty, they are dropped later
+            warnings.simplefilter("ignore", UserWarning)
+            return np.loadtxt(block.decode().splitlines(),
+                              delimiter=self.delimiter,
+                              usecols=self.usecols, ndmin=2)
+
+    def parse(self, file_name):
+        ''' Parse the text log in blocks of complete lines '''
+        chunks = []
+        with open(file_name, 'rb') as fp:
+            while True:
+                block = fp.read(self.chunk_size)
+                if len(block) == 0:
+                    break
+                block += fp.readline()
+                chunks.append(self.__parse_block(block))
+        chunks = [chunk for chunk in chunks if len(chunk) > 0]
+        if len(chunks) == 0:
+            return np.zeros(0)
+        data = np.concatenate(chunks)
+        # one column logs are returned as 1D arrays (like np.loadtxt)
+        if data.shape[1] == 1:
+            return data.ravel()
+        return data
+
+    def load(self, file_name):
+        if not self.cache:
+            return self.parse(file_name)
+        data = self.__read_cache(file_name)
+        if data is not None:
+            return data
+        description = self.__description(file_name)
+        data = self.parse(file_name)
+        self.__write_cache(file_name, data, description)
+        cached = self.__read_cache(file_name)
+        return data if cached is None else cached
+
+
+def load_log(file_name, delimiter=' ', usecols=None, cache=True):
+    ''' Load the past runs from a text log using a LogLoader '''
+    return LogLoader(delimiter=delimiter, usecols=usecols,
+                     cache=cache).load(file_name)
+
+
+def parse_elapsed(values):
+    ''' Convert sacct elapsed times ([DD-][HH:]MM:SS or seconds) to
+    seconds for a whole array of strings at once '''
+    values = np.char.strip(np.asarray(values, dtype=str))
+    days, sep, clock = np.moveaxis(np.char.partition(values, '-'), -1, 0)
+    has_days = sep != ''
+    clock = np.where(has_days, clock, days)
+    days = np.where(has_days, days, '0')
+    seconds = np.zeros(len(values))
+    for unit in [1, 60, 3600]:
+        clock, _, part = np.moveaxis(np.char.rpartition(clock, ':'), -1, 0)
+        seconds += unit * np.where(part == '', '0', part).astype(float)
+    return seconds + 86400 * days.astype(float)
+
+
+class AccountingLogIngestion():
+    ''' Computes the sequences of requests for every job class of an
+    sacct-style CSV (one header line, one job per line). The jobs are
+    grouped by the group_by columns (sorted and split with NumPy), groups
+    with less than min_history runs (elapsed > 0) are skipped and the
+    estimations of the other groups run in parallel with a BatchEstimator.
+
+    Example: AccountingLogIngestion(min_history=20).run("sacct.csv",
+                                                        "sequences.csv") '''
+
+    def __init__(self, group_by=("User", "JobName", "NNodes"),
+                 runtime="Elapsed", min_history=10, delimiter=',',
+                 params=rqs.ResourceParameters(), cluster_cost=None,
+                 workers=None, chunk_size=1 << 24):
+        assert (min_history > 0), "Invalid minimum history"
+        self.group_by = list(group_by)
+        self.runtime = runtime
+        self.min_history = min_history
+        self.delimiter = delimiter
+        self.params = params
+        self.cluster_cost = cluster_cost
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.skipped = {}
+        self.errors = {}
+
+    def read(self, file_name):
+        ''' Returns the group columns (one string array per column) and
+        the runtimes in seconds '''
+        columns = self.group_by + [self.runtime]
+        with open(file_name) as fp:
+            header = [name.strip().lower()
+                      for name in fp.readline().split(self.delimiter)]
+            missing = [name for name in columns
+                       if name.lower() not in header]
+            assert (len(missing) == 0), "Missing columns %s" % (missing)
+            usecols = [header.index(name.lower()) for name in columns]
+            chunks = []
+            while True:
+                lines = fp.readlines(self.chunk_size)
+                if len(lines) == 0:
+                    break
+                chunks.append(np.loadtxt(lines, delimiter=self.delimiter,
+                                         usecols=usecols, dtype=str,
+                                         ndmin=2))
+        records = np.concatenate(chunks) if len(chunks) > 0 else \
+            np.zeros((0, len(columns)), dtype=str)
+        keys = [np.char.strip(records[:, i])
+                for i in range(len(self.group_by))]
+        return keys, parse_elapsed(records[:, -1])
+
+    def group(self, keys, runtimes):
+        ''' Returns {group key: runtimes} for the groups with enough
+        history, the other groups are stored in self.skipped '''
+        valid = runtimes > 0
+        runtimes = runtimes[valid]
+        codes = np.array([np.unique(key[valid], return_inverse=True)[1]
+                          for key in keys]).reshape(len(keys), -1)
+        order = np.lexsort(codes[::-1])
+        codes = codes[:, order]
+        bounds = np.flatnonzero(np.any(np.diff(codes, axis=1) != 0,
+                                       axis=0)) + 1
+        first = np.concatenate(([0], bounds)).astype(int)
+        names = [key[valid][order][first] for key in keys]
+
+        self.skipped = {}
+        groups = {}
+        for i, runs in enumerate(np.split(runtimes[order], bounds)):
+            if len(runs) == 0:
+                continue
+            group = tuple(str(name[i]) for name in names)
+            if len(runs) < self.min_history:
+                self.skipped[group] = len(runs)
+            else:
+                groups[group] = runs
+        return groups
+
+    def compute_request_sequences(self, groups):
+        ''' Returns the rows (group key, runs, sequence, average
+        submissions) sorted by group key, failed groups are in
+        self.errors '''
+        batch = rqs.BatchEstimator(params=self.params,
+                                   cluster_cost=self.cluster_cost,
+                                   workers=self.workers)
+        results = {key: (sequence, submissions) for key, sequence,
+                   submissions in batch.compute_request_sequences(groups)}
+        self.errors = batch.errors
+        return [(key, len(groups[key])) + results[key]
+                for key in sorted(results)]
+
+    def write(self, rows, output):
+        with open(output, "w", newline='') as fp:
+            writer = csv.writer(fp)
+            writer.writerow(self.group_by + ["runs", "avg_submissions",
+                                             "sequence"])
+            for key, runs, sequence, submissions in rows:
+                sequence = [[float(request[0]), int(request[1])]
+                            for request in sequence]
+                writer.writerow(list(key) + [runs, float(submissions),
+                                             json.dumps(sequence)])
+
+    def run(self, file_name, output=None):
+        keys, runtimes = self.read(file_name)
+        rows = self.compute_request_sequences(self.group(keys, runtimes))
+        if output is not None:
+            self.write(rows, output)
+        return rows
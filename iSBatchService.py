@@ -0,0 +1,275 @@
+import argparse
+import json
+import os
+import socket
+import socketserver
+import threading
+from concurrent.futures import Future
+import iSBatch as rqs
+import iSBatchLoader
+
+
+def make_parameters(description):
+    ''' ResourceParameters from a JSON dictionary {attribute: value}, the
+    strategies are given by name (e.g. "CR_strategy": "AlwaysCheckpoint") '''
+    params = rqs.ResourceParameters()
+    for name, value in (description or {}).items():
+        assert (hasattr(rqs.ResourceParameters, name)), \
+            "Unknown parameter %s" % (name)
+        if name == "CR_strategy" and isinstance(value, str):
+            value = rqs.CRStrategy[value]
+        if name == "submissions_limit_strategy" and isinstance(value, str):
+            value = rqs.LimitStrategy[value]
+        setattr(params, name, value)
+    return params
+
+
+def make_cluster_cost(cost=None, checkpoint=None):
+    ''' ClusterCosts from [alpha, beta, gamma] and the static checkpoint
+    [checkpoint_cost, restart_cost] '''
+    model = None
+    if checkpoint is not None:
+        model = rqs.StaticCheckpointMemoryModel(*checkpoint)
+    return rqs.ClusterCosts(*(cost or []), checkpoint_memory_model=model)
+
+
+class Server(socketserver.ThreadingUnixStreamServer):
+    # bursts of submissions connect at the same time, the default backlog
+    # (5) refuses the connections above it
+    request_queue_size = 128
+
+
+class Application():
+    ''' Warm ResourceEstimator of one application and the sequences already
+    computed for it, keyed by the cluster cost '''
+
+    def __init__(self, name, log, params=None, delimiter=' '):
+        self.name = name
+        self.log = log
+        self.params = params
+        self.loader = iSBatchLoader.LogLoader(delimiter=delimiter)
+        # lock protects the fields below and is only held for short reads
+        # and writes, compute_lock serializes the uses of the estimator
+        self.lock = threading.Lock()
+        self.compute_lock = threading.Lock()
+        self.version = None
+        self.estimator = None
+        self.sequences = {}
+
+    def get_version(self):
+        stat = os.stat(self.log)
+        return (stat.st_size, stat.st_mtime_ns)
+
+    def load(self):
+        ''' Returns a new estimator for the current history '''
+        version = self.get_version()
+        history = self.loader.load(self.log)
+        return version, rqs.ResourceEstimator(
+            history, params=make_parameters(self.params))
+
+    def compute(self, estimator, key):
+        sequence = estimator.compute_request_sequence(
+            cluster_cost=make_cluster_cost(*key))
+        return {"sequence": [[float(request[0]), int(request[1])]
+                             for request in sequence],
+                "avg_submissions": float(estimator._avg_submissions)}
+
+
+class SequenceService():
+    ''' Serves the sequences of requests of the registered applications on
+    a Unix domain socket. Each request and response is one JSON line:
+        {"app": name, "cost": [alpha, beta, gamma], "checkpoint": [C, R]}
+        {"sequence": [[request, checkpoint], ...], "avg_submissions": x,
+         "cached": bool} or {"error": message}
+    The estimators stay in memory, the sequences are cached per cluster
+    cost and concurrent identical requests share one computation. A
+    background thread reloads the applications whose history file changed
+    every refresh_interval seconds and recomputes their cached sequences '''
+
+    def __init__(self, socket_path, refresh_interval=5):
+        self.socket_path = socket_path
+        self.refresh_interval = refresh_interval
+        self.applications = {}
+        self.stats = {"requests": 0, "computed": 0, "refreshed": 0}
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._server = None
+        self._threads = []
+
+    def register(self, name, log, params=None, delimiter=' '):
+        ''' Add an application (params is the JSON dictionary of the
+        ResourceParameters) and load its history '''
+        application = Application(name, log, params=params,
+                                  delimiter=delimiter)
+        application.version, application.estimator = application.load()
+        self.applications[name] = application
+
+    def __count(self, stat):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def get_sequence(self, name, cost=None, checkpoint=None):
+        self.__count("requests")
+        application = self.applications[name]
+        key = (tuple(cost) if cost is not None else None,
+               tuple(checkpoint) if checkpoint is not None else None)
+        with application.lock:
+            result = application.sequences.get(key)
+        if result is not None:
+            return dict(result, cached=True)
+        # identical requests wait for the one already computing, no lock is
+        # held during a computation so the other applications are served
+        with self._lock:
+            future = self._pending.get((name, key))
+            owner = future is None
+            if owner:
+                future = Future()
+                self._pending[(name, key)] = future
+        if not owner:
+            return dict(future.result(), cached=True)
+        try:
+            # the previous owner may have finished in the meantime
+            with application.lock:
+                result = application.sequences.get(key)
+                estimator = application.estimator
+            cached = result is not None
+            if not cached:
+                with application.compute_lock:
+                    result = application.compute(estimator, key)
+                with application.lock:
+                    # not stored if the history was reloaded meanwhile
+                    if application.estimator is estimator:
+                        application.sequences[key] = result
+                self.__count("computed")
+            future.set_result(result)
+        except Exception as error:
+            future.set_exception(error)
+            raise
+        finally:
+            with self._lock:
+                del self._pending[(name, key)]
+        return dict(result, cached=cached)
+
+    def refresh(self):
+        ''' Reload the applications whose history changed, the estimator
+        and the sequences are replaced only once they are recomputed '''
+        for application in list(self.applications.values()):
+            try:
+                if application.get_version() == application.version:
+                    continue
+                version, estimator = application.load()
+                with application.lock:
+                    keys = list(application.sequences)
+                sequences = {key: application.compute(estimator, key)
+                             for key in keys}
+            except (OSError, ValueError, AssertionError):
+                # the history is being written, try again later
+                continue
+            with application.lock:
+                application.version = version
+                application.estimator = estimator
+                application.sequences = sequences
+            self.__count("refreshed")
+
+    def handle(self, message):
+        ''' Answer one JSON request '''
+        try:
+            request = json.loads(message)
+            if request.get("app") not in self.applications:
+                return {"error": "Unknown application %s" % (
+                    request.get("app"))}
+            return self.get_sequence(request["app"],
+                                     cost=request.get("cost"),
+                                     checkpoint=request.get("checkpoint"))
+        except Exception as error:
+            return {"error": "%s: %s" % (type(error).__name__, error)}
+
+    def __refresh_loop(self):
+        while not self._stop.wait(self.refresh_interval):
+            self.refresh()
+
+    def start(self):
+        ''' Serve the requests and refresh the histories in background
+        threads '''
+        service = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    if len(line.strip()) == 0:
+                        continue
+                    response = service.handle(line)
+                    self.wfile.write(json.dumps(response).encode() + b"\n")
+                    self.wfile.flush()
+
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        self._stop.clear()
+        self._server = Server(self.socket_path, Handler)
+        self._server.daemon_threads = True
+        self._threads = [
+            threading.Thread(target=self._server.serve_forever, daemon=True),
+            threading.Thread(target=self.__refresh_loop, daemon=True)]
+        for thread in self._threads:
+            thread.start()
+
+    def wait(self):
+        self._stop.wait()
+
+    def stop(self):
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+
+def request_sequence(socket_path, app, cost=None, checkpoint=None,
+                     timeout=1):
+    ''' Client side: ask the service for the sequence of an application '''
+    request = {"app": app}
+    if cost is not None:
+        request["cost"] = list(cost)
+    if checkpoint is not None:
+        request["checkpoint"] = list(checkpoint)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        client.connect(socket_path)
+        client.sendall(json.dumps(request).encode() + b"\n")
+        with client.makefile("rb") as response:
+            return json.loads(response.readline())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Serve the sequences of requests on a Unix socket")
+    parser.add_argument("socket_path")
+    parser.add_argument("config", help="JSON file {app: {\"log\": file, "
+                        "\"params\": {...}, \"delimiter\": \" \"}}")
+    parser.add_argument("--refresh", type=float, default=5,
+                        help="seconds between the checks of the histories")
+    args = parser.parse_args()
+
+    with open(args.config) as fp:
+        config = json.load(fp)
+    service = SequenceService(args.socket_path, refresh_interval=args.refresh)
+    for name, application in config.items():
+        service.register(name, application["log"],
+                         params=application.get("params"),
+                         delimiter=application.get("delimiter", ' '))
+        # warm the cache with the default cluster cost
+        service.get_sequence(name)
+    service.start()
+    print("Serving %d applications on %s" % (len(config), args.socket_path))
+    try:
+        service.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.stop()
@@ -0,0 +1,181 @@
+import argparse
+import numpy as np
+
+# mixtures of (distribution, parameters, weight) for common runtime shapes
+PRESETS = {
+    # like examples/logs/truncnorm.in
+    "truncnorm": [("normal", {"loc": 8, "scale": 2}, 1)],
+    "lognormal": [("lognormal", {"mean": 8, "sigma": 1}, 1)],
+    "heavy_tail": [("pareto", {"shape": 1.5, "scale": 600}, 1)],
+    "bimodal": [("normal", {"loc": 3600, "scale": 300}, 0.6),
+                ("normal", {"loc": 14400, "scale": 1200}, 0.4)],
+    "multimodal": [("lognormal", {"mean": 6, "sigma": 0.3}, 0.5),
+                   ("lognormal", {"mean": 8, "sigma": 0.2}, 0.3),
+                   ("weibull", {"shape": 4, "scale": 20000}, 0.2)],
+}
+
+# (fraction of the runtime, memory size in KB) of each phase, similar to
+# the SLANT_run*.mem traces
+MEMORY_PHASES = [(0, 1.9e6), (0.05, 3e6), (0.2, 9.8e6), (0.9, 4e6)]
+
+
+class WorkloadGenerator():
+    ''' Seeded generator of synthetic histories of past runs: runtimes
+    drawn from parametric distributions or mixtures of them, and memory
+    traces of the runs for the DynamicCheckpointMemoryModel. The same seed
+    always gives the same workload.
+
+    Example: WorkloadGenerator(seed=1).get_runtimes(10**7, "heavy_tail",
+                                                    resolution=60) '''
+
+    def __init__(self, seed=None):
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+
+    def __draw(self, distribution, params, size):
+        rng = self.rng
+        if distribution == "normal":
+            # truncated to positive values
+            values = rng.normal(params["loc"], params["scale"], size)
+            negative = np.flatnonzero(values <= 0)
+            while len(negative) > 0:
+                values[negative] = rng.normal(params["loc"], params["scale"],
+                                              len(negative))
+                negative = negative[values[negative] <= 0]
+            return values
+        if distribution == "lognormal":
+            return rng.lognormal(params["mean"], params["sigma"], size)
+        if distribution == "exponential":
+            return rng.exponential(params["scale"], size)
+        if distribution == "gamma":
+            return rng.gamma(params["shape"], params["scale"], size)
+        if distribution == "weibull":
+            return params["scale"] * rng.weibull(params["shape"], size)
+        if distribution == "pareto":
+            # Pareto with minimum scale (heavy tail for small shapes)
+            return params["scale"] * (1 + rng.pareto(params["shape"], size))
+        if distribution == "uniform":
+            return rng.uniform(params["low"], params["high"], size)
+        assert (False), "Unknown distribution %s" % (distribution)
+
+    def get_runtimes(self, size, components="lognormal", resolution=None,
+                     limit=None):
+        ''' Array of size runtimes from a preset name or a list of
+        (distribution, parameters, weight). The runtimes are rounded up to
+        a multiple of resolution (ties, e.g. 60 for minutes) and capped at
+        limit (runs killed at the walltime limit) '''
+        if isinstance(components, str):
+            assert (components in PRESETS), \
+                "Unknown workload %s" % (components)
+            components = PRESETS[components]
+        assert (size >= 0), "Invalid size"
+        assert (len(components) > 0), "Empty mixture"
+        if len(components) == 1:
+            distribution, params, _ = components[0]
+            runtimes = self.__draw(distribution, params, size)
+        else:
+            weights = np.array([i[2] for i in components], dtype=float)
+            assert (all(weights >= 0) and sum(weights) > 0), \
+                "Invalid mixture weights"
+            counts = self.rng.multinomial(size, weights / sum(weights))
+            runtimes = np.concatenate([
+                self.__draw(distribution, params, count) for
+                (distribution, params, _), count in zip(components, counts)])
+            # the components are interleaved like in a real log
+            runtimes = self.rng.permutation(runtimes)
+        if resolution is not None:
+            runtimes = np.maximum(np.ceil(runtimes / resolution), 1) \
+                * resolution
+        if limit is not None:
+            runtimes = np.minimum(runtimes, limit)
+        return runtimes
+
+    def get_memory_trace(self, runtime, phases=MEMORY_PHASES, step=2,
+                         noise=0.002):
+        ''' Array of (ts, size in KB) sampled every step time units for a
+        run of the given runtime, the phases start at fractions of the
+        runtime and the sizes vary by noise (relative) '''
+        ts = np.arange(0, runtime, step, dtype=float)
+        starts = np.array([phase[0] for phase in phases]) * runtime
+        sizes = np.array([phase[1] for phase in phases], dtype=float)
+        trace = sizes[np.searchsorted(starts, ts, side='right') - 1]
+        trace *= 1 + noise * self.rng.standard_normal(len(ts))
+        return np.column_stack((ts, np.round(np.maximum(trace, 0))))
+
+    def get_memory_traces(self, runtimes, phases=MEMORY_PHASES, step=2,
+                          noise=0.002):
+        ''' One memory trace for each runtime '''
+        return [self.get_memory_trace(runtime, phases=phases, step=step,
+                                      noise=noise) for runtime in runtimes]
+
+
+def write_runtimes(file_name, runtimes, chunk_size=1 << 20):
+    ''' Write the runtimes one per line (like the logs in examples/logs)
+    or in a .npy file '''
+    if file_name.endswith('.npy'):
+        np.save(file_name, np.asarray(runtimes, dtype=float))
+        return
+    with open(file_name, "w") as fp:
+        for start in range(0, len(runtimes), chunk_size):
+            chunk = np.asarray(runtimes[start:start + chunk_size],
+                               dtype=float)
+            fp.write("\n".join(map(repr, chunk.tolist())) + "\n")
+
+
+def write_memory_trace(file_name, trace):
+    ''' Write a trace as "ts, size" lines (like SLANT_run*.mem, read by the
+    MemoryTraceBuilder) or in a .npy file '''
+    if file_name.endswith('.npy'):
+        np.save(file_name, np.asarray(trace, dtype=float))
+        return
+    np.savetxt(file_name, trace, delimiter=', ', fmt='%d')
+
+
+def write_accounting_log(file_name, groups):
+    ''' Write an sacct-style CSV from {(user, job name, nodes): runtimes}
+    (read by the AccountingLogIngestion) '''
+    with open(file_name, "w") as fp:
+        fp.write("JobID,User,JobName,NNodes,Elapsed\n")
+        job = 0
+        for (user, name, nodes), runtimes in groups.items():
+            seconds = np.ceil(np.asarray(runtimes, dtype=float)).astype(int)
+            days, seconds = np.divmod(seconds, 86400)
+            hours, seconds = np.divmod(seconds, 3600)
+            minutes, seconds = np.divmod(seconds, 60)
+            for i in range(len(days)):
+                elapsed = "%02d:%02d:%02d" % (hours[i], minutes[i],
+                                              seconds[i])
+                if days[i] > 0:
+                    elapsed = "%d-%s" % (days[i], elapsed)
+                fp.write("%d,%s,%s,%s,%s\n" % (job, user, name, nodes,
+                                               elapsed))
+                job += 1
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Generate a synthetic history of runtimes")
+    parser.add_argument("output", help="runtime log (text or .npy)")
+    parser.add_argument("size", type=int)
+    parser.add_argument("--workload", default="lognormal",
+                        choices=sorted(PRESETS))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--resolution", type=float, default=None,
+                        help="round the runtimes up to multiples of it")
+    parser.add_argument("--limit", type=float, default=None,
+                        help="walltime limit of the runs")
+    parser.add_argument("--memory-traces", type=int, default=0,
+                        help="write memory traces of the first runs in "
+                        "<output>_run<id>.mem")
+    args = parser.parse_args()
+
+    generator = WorkloadGenerator(seed=args.seed)
+    runtimes = generator.get_runtimes(args.size, args.workload,
+                                      resolution=args.resolution,
+                                      limit=args.limit)
+    write_runtimes(args.output, runtimes)
+    traces = generator.get_memory_traces(runtimes[:args.memory_traces])
+    for i, trace in enumerate(traces):
+        write_memory_trace("%s_run%d.mem" % (args.output, i + 1), trace)
+    print("%d runtimes written in %s (%d memory traces)" % (
+        len(runtimes), args.output, len(traces)))
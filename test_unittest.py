@@ -1,8 +1,17 @@
 import unittest
 import numpy as np
 import iSBatch as rqs
+import iSBatchLoader
+import iSBatchService
+import iSBatchWorkload
 from scipy.stats import norm
 import warnings
+import tempfile
+import os
+import shutil
+import threading
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 
 def ignore_warnings(test_func):
     def do_test(self, *args, **kwargs):
@@ -33,6 +42,80 @@ class TestEstimationParameters(unittest.TestCase):
         self.assertTrue(wl.fit_model is None)
         self.assertTrue(wl.best_fit is None)
 
+    def test_parallel_fitting(self):
+        history = np.loadtxt("examples/logs/truncnorm.in", delimiter=' ')
+        x, y = np.unique(history[:50]), np.arange(1, 51) / 50
+        serial = rqs.DistInterpolation().get_best_fit(x, y)
+        parallel = rqs.DistInterpolation(workers=3).get_best_fit(x, y)
+        self.assertEqual(serial[0], parallel[0])
+        self.assertEqual(serial[2], parallel[2])
+        # fits exceeding the time limit are dropped
+        fit = rqs.DistInterpolation(list_of_distr=[rqs.st.exponweib],
+                                    timeout=1e-4).get_best_fit(x, y)
+        self.assertEqual(fit[0], -1)
+        # an alarm firing right after it is armed does not escape the fit
+        for i in range(20):
+            fit = rqs.DistInterpolation(list_of_distr=[norm],
+                                        timeout=1e-6).get_best_fit(x, y)
+            self.assertTrue(fit[0] in [-1, 0])
+        params = rqs.ResourceParameters()
+        params.fitting_workers = 2
+        params.fitting_timeout = 5
+        wl = rqs.ResourceEstimator([3, 4, 5], params=params)
+        self.assertEqual(wl.fit_model[0].workers, 2)
+        self.assertEqual(wl.fit_model[0].timeout, 5)
+
+    def test_fit_cache(self):
+        history = np.loadtxt("examples/logs/truncnorm.in", delimiter=' ')
+        with tempfile.TemporaryDirectory() as path:
+            for model in [rqs.DistInterpolation(list_of_distr=[norm]),
+                          rqs.PolyInterpolation()]:
+                params = rqs.ResourceParameters()
+                params.interpolation_model = model
+                params.fit_cache = rqs.FitCache(path)
+                wl = rqs.ResourceEstimator(history[:50], params=params)
+                fit = wl._get_best_fit()
+                sequence = wl.compute_request_sequence()
+                # the second estimator reads the fit from the cache
+                model.get_best_fit = None
+                wl = rqs.ResourceEstimator(history[:50], params=params)
+                self.assertEqual(wl._get_best_fit()[0], fit[0])
+                self.assertAlmostEqual(wl._get_best_fit()[2], fit[2])
+                self.assertEqual(wl.compute_request_sequence(), sequence)
+            self.assertEqual(len(params.fit_cache), 2)
+            # failed fits (here over the time limit) are not cached
+            params.interpolation_model = rqs.DistInterpolation(
+                list_of_distr=[rqs.st.exponweib], timeout=1e-4)
+            wl = rqs.ResourceEstimator(history[:50], params=params)
+            self.assertTrue(len(wl.compute_request_sequence()) > 0)
+            self.assertEqual(wl._get_best_fit()[0], -1)
+            self.assertEqual(len(params.fit_cache), 2)
+            self.assertEqual(params.interpolation_model.encode_fit(
+                params.interpolation_model.get_empty_fit()),
+                [None, [], np.inf])
+            cache = rqs.FitCache(path, max_entries=1)
+            cache.put("key", {"model": -1})
+            self.assertEqual(len(cache), 1)
+            self.assertEqual(cache.get("key"), {"model": -1})
+
+    def test_fit_cache_lambda(self):
+        history = np.loadtxt("examples/logs/truncnorm.in", delimiter=' ')
+        with tempfile.TemporaryDirectory() as path:
+            errors = []
+            for fct in [lambda x: np.log(x), lambda x: np.sqrt(x)]:
+                params = rqs.ResourceParameters()
+                params.interpolation_model = rqs.FunctionInterpolation(
+                    fct, order=2)
+                params.fit_cache = rqs.FitCache(path)
+                wl = rqs.ResourceEstimator(history[:50], params=params)
+                errors.append(wl._get_best_fit()[2])
+                # the fit without cache
+                params.fit_cache = None
+                wl = rqs.ResourceEstimator(history[:50], params=params)
+                self.assertAlmostEqual(errors[-1], wl._get_best_fit()[2])
+            self.assertEqual(len(rqs.FitCache(path)), 2)
+            self.assertNotAlmostEqual(errors[0], errors[1])
+
     def test_init_discrete(self):
         params = rqs.ResourceParameters()
         params.interpolation_model=[]
@@ -57,8 +140,8 @@ class TestEstimationParameters(unittest.TestCase):
                                    params=params)
         wl._compute_cdf()
         cdf = [i / 6 for i in [2, 3, 4, 6]]
-        self.assertEqual(wl.discrete_data, [3, 5, 7, 9])
-        self.assertEqual(wl.cdf, cdf)
+        self.assertEqual(wl.discrete_data.tolist(), [3, 5, 7, 9])
+        self.assertEqual(wl.cdf.tolist(), cdf)
         wl = rqs.ResourceEstimator([5]*101)
         wl._compute_cdf()
         self.assertEqual(wl.discrete_data, [5])
@@ -76,6 +159,20 @@ class TestEstimationParameters(unittest.TestCase):
         seq = wl.compute_request_sequence()
         self.assertEqual(seq, [(7, 0)])
 
+    def test_interpolation_cdf(self):
+        history = np.loadtxt("examples/logs/truncnorm.in", delimiter=' ')
+        for model in [rqs.FunctionInterpolation(np.log, order=2),
+                      rqs.PolyInterpolation(),
+                      rqs.DistInterpolation(list_of_distr=[norm])]:
+            params = rqs.ResourceParameters()
+            params.interpolation_model = model
+            wl = rqs.ResourceEstimator(history[:50], params=params)
+            data, cdf = wl._get_cdf()
+            self.assertEqual(len(data), 500)
+            self.assertEqual(data[-1], max(history[:50]))
+            self.assertTrue(all(cdf >= 0) and all(cdf <= 1))
+            self.assertTrue(all(np.diff(cdf) >= 0))
+
     def test_default_discretization(self):
         with self.assertRaises(AssertionError):
             params = rqs.ResourceParameters()
@@ -249,6 +346,255 @@ class TestSequence(unittest.TestCase):
             reservation_cost = 1, utilization_cost=0, deploy_cost=0))
         self.assertTrue(abs(sequence[0][0]/3600 - 22.4) < 0.1)
 
+    def test_envelope_sequence(self):
+        # the lower envelope solver gives the same table as the O(n^2) loop
+        history = np.loadtxt("examples/logs/CT_eye_segmentation.log",
+                             delimiter=' ')
+        params = rqs.ResourceParameters()
+        params.interpolation_model = []
+        wl = rqs.ResourceEstimator(history, params=params)
+        data, cdf = wl._get_cdf()
+        for cost in [rqs.ClusterCosts(1, 1, 0), rqs.ClusterCosts(1, 0, 0),
+                     rqs.ClusterCosts(0, 1, 0), rqs.ClusterCosts(1, 2, 3)]:
+            handler = rqs.RequestSequence(data, cdf, cost)
+            sequence = handler.compute_request_sequence()
+            envelope_E = dict(handler._E)
+            handler._E = {}
+            handler._request_sequence = []
+            handler.compute_E_table_quadratic(0)
+            self.assertEqual(sequence, handler.compute_request_sequence())
+            for i in envelope_E:
+                self.assertAlmostEqual(envelope_E[i][0], handler._E[i][0])
+                self.assertEqual(envelope_E[i][1], handler._E[i][1])
+
+    def test_envelope_large_discretization(self):
+        data = list(np.linspace(1, 100, 50000))
+        cdf = list(np.linspace(0, 1, 50001)[1:] ** 2)
+        handler = rqs.RequestSequence(data, cdf, rqs.ClusterCosts())
+        sequence = handler.compute_request_sequence()
+        self.assertEqual(sequence[-1][0], 100)
+        self.assertEqual(len(handler._E), 50001)
+
+    def test_add_runs(self):
+        # updating the table gives the same sequence as recomputing it
+        history = list(np.loadtxt("examples/logs/CT_eye_segmentation.log",
+                                  delimiter=' '))
+        params = rqs.ResourceParameters()
+        params.interpolation_model = []
+        wl = rqs.ResourceEstimator(history, params=params)
+        cost = rqs.ClusterCosts(1, 2, 3)
+        wl.compute_request_sequence(cluster_cost=cost)
+        for runs in [[min(history) / 2], [history[0], 11.5],
+                     [max(history) * 2]]:
+            history = history + runs
+            previous = wl.data
+            wl.add_runs(runs)
+            self.assertEqual(wl.data.tolist(), history)
+            sequence = wl.compute_request_sequence(cluster_cost=cost)
+            ref = rqs.ResourceEstimator(history, params=params)
+            self.assertEqual(sequence,
+                             ref.compute_request_sequence(cluster_cost=cost))
+            self.assertEqual(wl.discrete_data.tolist(),
+                             ref.discrete_data.tolist())
+            self.assertTrue(np.allclose(wl.cdf, ref.cdf))
+        self.assertEqual(sequence[-1][0], max(history))
+        # the runs are appended in place after the first add
+        self.assertTrue(np.shares_memory(previous, wl.data))
+
+    @ignore_warnings
+    def test_sequence_sweep(self):
+        history = np.loadtxt("examples/logs/CT_eye_segmentation.log",
+                             delimiter=' ')
+        costs = [rqs.ClusterCosts(1, 1, 0), rqs.ClusterCosts(1, 0, 0),
+                 rqs.ClusterCosts(0, 1, 0), rqs.ClusterCosts(1, 2, 3)]
+        for strategy in [rqs.CRStrategy.NeverCheckpoint,
+                         rqs.CRStrategy.AlwaysCheckpoint]:
+            params = rqs.ResourceParameters()
+            params.CR_strategy = strategy
+            wl = rqs.ResourceEstimator(history, params=params)
+            sweep = wl.compute_request_sequence_sweep(costs)
+            self.assertEqual(len(sweep), len(costs))
+            data, cdf = wl._get_cdf()
+            for cost, (sequence, makespan) in zip(costs, sweep):
+                self.assertEqual(sequence,
+                                 wl.compute_request_sequence(cost))
+                # the expected makespan of the dynamic program
+                if strategy == rqs.CRStrategy.AlwaysCheckpoint:
+                    handler = rqs.AllCheckpointSequence(data, cdf, cost)
+                else:
+                    handler = rqs.RequestSequence(data, cdf, cost)
+                self.assertAlmostEqual(makespan,
+                                       handler.get_expected_makespan())
+            if strategy == rqs.CRStrategy.NeverCheckpoint:
+                # on the discrete CDF it is the mean cost on the history
+                self.assertAlmostEqual(sweep[0][1] / wl.compute_sequence_cost(
+                    sweep[0][0], history, costs[0])[0], 1)
+        # with an increment limit the costs use the quadratic table
+        sweep = rqs.RequestSequenceSweep(data, cdf, costs, params=[5000])
+        for cost, makespan in zip(costs, sweep.get_expected_makespans()):
+            self.assertAlmostEqual(makespan, rqs.RequestSequence(
+                data, cdf, cost, params=[5000]).get_expected_makespan())
+
+    @ignore_warnings
+    def test_batch_sequences(self):
+        histories = {
+            "truncnorm": np.loadtxt("examples/logs/truncnorm.in",
+                                    delimiter=' '),
+            "CT": np.loadtxt("examples/logs/CT_eye_segmentation.log",
+                             delimiter=' '),
+            "short": [5] * 10, "empty": []}
+        batch = rqs.BatchEstimator(workers=2)
+        results = {}
+        for key, sequence, submissions in \
+                batch.compute_request_sequences(histories):
+            results[key] = sequence
+        self.assertEqual(set(results), {"truncnorm", "CT", "short"})
+        self.assertTrue("empty" in batch.errors)
+        self.assertEqual(results["short"], [(5, 0)])
+        wl = rqs.ResourceEstimator(histories["CT"])
+        self.assertEqual(results["CT"], wl.compute_request_sequence())
+
+    def test_bootstrap_evaluation(self):
+        data = np.loadtxt("examples/logs/CT_eye_segmentation.log",
+                          delimiter=' ')
+        result = rqs.BootstrapEvaluator(resamples=25, batch_size=10, seed=2,
+                                        workers=2).evaluate(data[:150], data)
+        self.assertEqual(len(result["ratios"]), 25)
+        self.assertEqual(len(result["sequences"]), 25)
+        # the sequence computed on the data is optimal for the data
+        wl = rqs.ResourceEstimator(data)
+        self.assertEqual(result["reference_sequence"],
+                         wl.compute_request_sequence())
+        self.assertTrue(all(result["ratios"] >= 1 - 1e-9))
+        self.assertTrue(result["interval"][0] <= result["mean"] <=
+                        result["interval"][1])
+        # the random streams do not depend on the number of workers
+        other = rqs.BootstrapEvaluator(resamples=25, batch_size=10, seed=2,
+                                       workers=1).evaluate(data[:150], data)
+        self.assertEqual(result["costs"].tolist(), other["costs"].tolist())
+        # each resample is replayed like the sequence of one estimator
+        cost = rqs.LogDataCost(result["sequences"][3]).compute_cost(
+            data, rqs.ClusterCosts())
+        self.assertAlmostEqual(result["costs"][3], cost)
+
+    def test_instrumentation(self):
+        history = np.loadtxt("examples/logs/CT_eye_segmentation.log",
+                             delimiter=' ')
+        records = []
+        params = rqs.ResourceParameters()
+        params.instrumentation = rqs.EstimatorStats(
+            hook=lambda kind, name, value: records.append((kind, name)))
+        params.interpolation_model = rqs.DistInterpolation(
+            list_of_distr=[rqs.st.norm, rqs.st.lognorm])
+        params.CR_strategy = rqs.CRStrategy.AlwaysCheckpoint
+        wl = rqs.ResourceEstimator(history, params=params)
+        sequence = wl.compute_request_sequence()
+        stats = params.instrumentation.to_dict()
+        for stage in ["cdf", "discrete_cdf", "best_fit", "fit:norm",
+                      "fit:lognorm", "interpolation_cdf", "e_table",
+                      "traceback", "submissions"]:
+            self.assertEqual(stats["calls"][stage], 1)
+        self.assertEqual(stats["counters"]["fit_attempts"], 2)
+        self.assertEqual(stats["values"]["best_model"][0],
+                         "DistInterpolation")
+        self.assertTrue(stats["counters"]["dp_states"] > 0)
+        self.assertTrue(stats["values"]["e_table_bytes"] > 0)
+        self.assertIn(("time", "e_table"), records)
+        # the instrumentation does not change the sequence
+        params.instrumentation = None
+        self.assertEqual(sequence, rqs.ResourceEstimator(
+            history, params=params).compute_request_sequence())
+
+    def test_histogram_runs(self):
+        history = np.loadtxt("examples/logs/CT_eye_segmentation.log",
+                             delimiter=' ')
+        values, counts = np.unique(history, return_counts=True)
+        wl = rqs.ResourceEstimator(values, weights=counts)
+        sequence = wl.compute_request_sequence()
+        self.assertEqual(sequence,
+                         rqs.ResourceEstimator(history).compute_request_sequence())
+        cost = wl.compute_sequence_cost(sequence, values, weights=counts)
+        self.assertAlmostEqual(cost[0], wl.compute_sequence_cost(
+            sequence, history)[0])
+        # the updates of the histogram are incremental
+        wl = rqs.ResourceEstimator(values[:100], weights=counts[:100])
+        wl.compute_request_sequence()
+        wl.add_runs(values[100:], weights=counts[100:])
+        self.assertEqual(wl.compute_request_sequence(), sequence)
+        # the discretization and the weighted fits use the histogram
+        params = rqs.ResourceParameters()
+        params.resource_discretization = 100
+        wl = rqs.ResourceEstimator(values, params=params, weights=counts)
+        data, cdf = wl._get_cdf()
+        self.assertEqual((len(data), data[-1], cdf[-1]), (100, values[-1], 1))
+        params.interpolation_model = rqs.PolyInterpolation()
+        params.weighted_fit = True
+        wl = rqs.ResourceEstimator(values, params=params, weights=counts)
+        self.assertTrue(wl._get_best_fit()[2] < np.inf)
+
+    def test_quantile_sketch(self):
+        history = np.loadtxt("examples/logs/CT_eye_segmentation.log",
+                             delimiter=' ')
+        params = rqs.ResourceParameters()
+        params.quantile_sketch = 50
+        params.resource_discretization = 100
+        wl = rqs.ResourceEstimator(history[:100], params=params)
+        for i in range(100, len(history), 50):
+            wl.add_runs(history[i:i + 50])
+        # the memory does not depend on the size of the history
+        self.assertTrue(len(wl.data) <= 52)
+        self.assertEqual(wl.sketch.count, len(history))
+        data, cdf = wl._get_cdf()
+        self.assertEqual(len(data), 100)
+        self.assertEqual((data[-1], cdf[-1]), (max(history), 1))
+        exact = np.searchsorted(np.sort(history), data,
+                                side='right') / len(history)
+        self.assertTrue(np.max(np.abs(exact - cdf)) < 0.05)
+        sequence = wl.compute_request_sequence()
+        self.assertEqual(sequence[-1][0], max(history))
+        # sketches of parts of the history can be merged
+        sketch = rqs.QuantileSketch(50)
+        sketch.add(history[:200])
+        other = rqs.QuantileSketch(50)
+        other.add(history[200:])
+        sketch.merge(other)
+        self.assertEqual(sketch.count, len(history))
+        self.assertTrue(len(sketch.get_values()) <= 52)
+        # with decay the sketch follows the most recent runs
+        sketch = rqs.QuantileSketch(50, decay=0.9)
+        sketch.add(np.full(500, 10))
+        sketch.add(np.full(100, 20))
+        data, cdf = sketch.get_discrete_cdf(10)
+        self.assertTrue(np.all(data > 19.9))
+
+    def test_dense_checkpoint_table(self):
+        data = [1, 2, 4, 8, 16]
+        cdf = [0.2, 0.4, 0.6, 0.8, 1]
+        handler = rqs.CheckpointSequence(data, cdf, rqs.ClusterCosts())
+        self.assertEqual(handler._E.value.shape, (5, 5))
+        self.assertTrue((0, 0) in handler._E)
+        self.assertFalse((1, 0) in handler._E)
+        # every (ic, il) state with ic <= il is computed
+        self.assertEqual(len(handler._E), 15)
+        self.assertEqual(handler._E[(3, 4)], (handler._sumFV, 4, 0))
+        sequence = handler.compute_request_sequence()
+        self.assertEqual(sum(i[0] for i in sequence if i[1] == 1) +
+                         sequence[-1][0], 16)
+        handler = rqs.AllCheckpointSequence(data, cdf, rqs.ClusterCosts())
+        self.assertEqual(handler._E.value.shape, (6, ))
+        self.assertTrue(all(i[1] == 1 for i in
+                            handler.compute_request_sequence()[:-1]))
+
+    def test_dense_checkpoint_large_discretization(self):
+        data = list(np.linspace(1, 100, 1000))
+        cdf = list(np.linspace(0, 1, 1001)[1:] ** 2)
+        handler = rqs.CheckpointSequence(data, cdf, rqs.ClusterCosts())
+        self.assertTrue(handler._E.nbytes <= 13 * 1000 * 1000)
+        sequence = handler.compute_request_sequence()
+        self.assertEqual(sequence[0][1], 1)
+        self.assertAlmostEqual(sum(i[0] for i in sequence if i[1] == 1) +
+                               sequence[-1][0], 100)
+
 
 # test the sequence extraction
 class TestLimitedSequence(unittest.TestCase):
@@ -312,9 +658,340 @@ class TestLimitedSequence(unittest.TestCase):
                 1.5, rqs.LimitStrategy.AverageBased)
         self.assertTrue(all(n <= 2 for n in sequence_lens))
 
+    def test_dense_limited_table(self):
+        data = list(np.arange(1., 41.))
+        cdf = list(np.arange(1, 41) / 40)
+        for strategy in [rqs.CRStrategy.NeverCheckpoint,
+                         rqs.CRStrategy.AlwaysCheckpoint,
+                         rqs.CRStrategy.AdaptiveCheckpoint]:
+            handler = rqs.LimitedSequence(
+                data, cdf, rqs.ClusterCosts(),
+                params=[strategy, rqs.LimitStrategy.ThresholdBased, 3, 0])
+            sequence = handler.compute_request_sequence()
+            self.assertTrue(len(sequence) <= 3)
+            self.assertEqual(sequence[-1][0] + sum(
+                s[0] for s in sequence if s[1] == 1), 40)
+            # the states ic <= il are only stored for the adaptive strategy
+            rows = 41 * 42 // 2 if handler._E.full else 41
+            self.assertEqual(handler._E.value.shape, (rows, 4))
+            with self.assertRaises(KeyError):
+                handler._E[(-1, -1, 2)]
+
+    def test_single_submission_limit(self):
+        data = list(np.arange(1., 41.))
+        cdf = list(np.arange(1, 41) / 40)
+        for th_strategy in [rqs.LimitStrategy.ThresholdBased,
+                            rqs.LimitStrategy.AverageBased]:
+            handler = rqs.LimitedSequence(
+                data, cdf, rqs.ClusterCosts(),
+                params=[rqs.CRStrategy.NeverCheckpoint, th_strategy, 1.0, 0])
+            self.assertEqual(handler.compute_request_sequence(), [(40, 0)])
+
+    def test_unfilled_limited_states(self):
+        data = list(np.arange(1., 41.))
+        cdf = list(np.arange(1, 41) / 40)
+        # no request satisfies the increment limit, the states reached are
+        # never computed
+        for limit in [2.5, 4]:
+            with self.assertRaises(KeyError):
+                handler = rqs.LimitedSequence(
+                    data, cdf, rqs.ClusterCosts(),
+                    params=[rqs.CRStrategy.AlwaysCheckpoint,
+                            rqs.LimitStrategy.ThresholdBased, limit, 5])
+                handler.compute_request_sequence()
+
+    @ignore_warnings
+    def test_submissions_frontier(self):
+        history = np.loadtxt('examples/logs/CT_eye_segmentation.log',
+                             delimiter=' ')
+        params = rqs.ResourceParameters()
+        params.submissions_limit = 4
+        params.CR_strategy = rqs.CRStrategy.AlwaysCheckpoint
+        wl = rqs.ResourceEstimator(history, params=params)
+        frontier = wl.compute_submissions_frontier()
+        self.assertEqual([entry[0] for entry in frontier], [1, 2, 3, 4])
+        for limit, sequence, makespan, submissions in frontier:
+            params.submissions_limit = limit
+            wl = rqs.ResourceEstimator(history, params=params)
+            self.assertEqual(sequence, wl.compute_request_sequence())
+            self.assertTrue(submissions <= limit)
+        # more submissions can only decrease the expected makespan
+        makespans = [entry[2] for entry in frontier]
+        self.assertTrue(all(np.diff(makespans) <= 0))
+
+    def test_async_solve(self):
+        history = np.loadtxt('examples/logs/CT_eye_segmentation.log',
+                             delimiter=' ')
+        params = rqs.ResourceParameters()
+        params.submissions_limit = 4
+        params.CR_strategy = rqs.CRStrategy.AdaptiveCheckpoint
+        expected = rqs.ResourceEstimator(
+            history, params=params).compute_request_sequence()
+
+        async def solve():
+            progress = []
+            wl = rqs.ResourceEstimator(history, params=params)
+            sequence = await wl.compute_request_sequence_async(
+                progress=progress.append)
+            self.assertEqual(sequence, expected)
+            self.assertEqual(progress[-1], 1)
+            self.assertTrue(all(np.diff(progress) > 0))
+
+            # cancelling the task stops the solve in the worker
+            progress = []
+            executor = ThreadPoolExecutor(1)
+            task = asyncio.create_task(rqs.ResourceEstimator(
+                history, params=params).compute_request_sequence_async(
+                    progress=progress.append, executor=executor))
+            while len(progress) == 0:
+                await asyncio.sleep(0.001)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            executor.shutdown(wait=True)
+            self.assertTrue(progress[-1] < 1)
+
+        asyncio.run(solve())
+        monitor = rqs.SolveMonitor()
+        monitor.cancel()
+        with self.assertRaises(rqs.SolveCancelled):
+            rqs.ResourceEstimator(history, params=params)\
+                .compute_request_sequence(monitor=monitor)
+
+    def test_multiresolution_solver(self):
+        history = np.loadtxt('examples/logs/CT_eye_segmentation.log',
+                             delimiter=' ')
+        params = rqs.ResourceParameters()
+        params.submissions_limit = 3
+        params.CR_strategy = rqs.CRStrategy.AdaptiveCheckpoint
+        params.multiresolution_grid = 30
+        wl = rqs.ResourceEstimator(history, params=params)
+        sequence = wl.compute_request_sequence()
+        report = wl._multiresolution_report
+        self.assertTrue(report is not None)
+        self.assertEqual(len(report["grid_sizes"]), report["iterations"])
+        self.assertTrue(max(report["grid_sizes"]) < len(np.unique(history)))
+        # the sequence still covers the largest past run
+        self.assertAlmostEqual(sum(request[0] for request in sequence),
+                               max(history))
+        self.assertTrue(wl._avg_submissions <= 3)
+
+
+# test the loader of past runs
+class TestLogLoader(unittest.TestCase):
+    def test_load_cached(self):
+        history = np.loadtxt("examples/logs/CT_eye_segmentation.log",
+                             delimiter=' ')
+        with tempfile.TemporaryDirectory() as tmp:
+            file_name = tmp + "/runs.log"
+            np.savetxt(file_name, history)
+            loader = iSBatchLoader.LogLoader(chunk_size=100)
+            data = loader.load(file_name)
+            self.assertEqual(data.tolist(), history.tolist())
+            self.assertTrue(isinstance(data, np.memmap))
+            # the estimator uses the mapped array without copy
+            wl = rqs.ResourceEstimator(data)
+            self.assertTrue(np.shares_memory(wl.data, data))
+            # a modified log invalidates the cache
+            np.savetxt(file_name, history[:10])
+            os.utime(file_name, ns=(1, 1))
+            self.assertEqual(loader.load(file_name).tolist(),
+                             history[:10].tolist())
+
+    def test_load_columns(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            file_name = tmp + "/runs.csv"
+            with open(file_name, "w") as fp:
+                fp.write("# walltime,memory\n1,10\n2,20\n\n3,30\n")
+            loader = iSBatchLoader.LogLoader(delimiter=',', chunk_size=4,
+                                             cache=False)
+            self.assertEqual(loader.load(file_name).tolist(),
+                             [[1, 10], [2, 20], [3, 30]])
+            data = iSBatchLoader.load_log(file_name, delimiter=',',
+                                          usecols=1)
+            self.assertEqual(data.tolist(), [10, 20, 30])
+
+    def test_accounting_ingestion(self):
+        history = np.loadtxt("examples/logs/CT_eye_segmentation.log",
+                             delimiter=' ')
+        self.assertEqual(iSBatchLoader.parse_elapsed(
+            ["1-00:00:02", "01:00:00", "02:30", "7"]).tolist(),
+            [86402, 3600, 150, 7])
+        jobs = [("alice", "ct", 1, run) for run in history[:200]] + \
+            [("bob", "ct", 2, run) for run in history[200:]] + \
+            [("bob", "test", 1, 60)] * 5 + [("alice", "ct", 1, 0)]
+        np.random.shuffle(jobs)
+        with tempfile.TemporaryDirectory() as tmp:
+            with open(tmp + "/sacct.csv", "w") as fp:
+                fp.write("JobID,User,JobName,NNodes,Elapsed\n")
+                for i, job in enumerate(jobs):
+                    fp.write("%d,%s,%s,%d,%d\n" % ((i,) + job))
+            ingestion = iSBatchLoader.AccountingLogIngestion(workers=2)
+            rows = ingestion.run(tmp + "/sacct.csv", tmp + "/out.csv")
+            with open(tmp + "/out.csv") as fp:
+                self.assertEqual(len(fp.readlines()), 3)
+        self.assertEqual([row[:2] for row in rows],
+                         [(("alice", "ct", "1"), 200),
+                          (("bob", "ct", "2"), len(history) - 200)])
+        self.assertEqual(ingestion.skipped, {("bob", "test", "1"): 5})
+        wl = rqs.ResourceEstimator(history[200:])
+        self.assertEqual(rows[1][2], wl.compute_request_sequence())
+
+
+# test the sequence service on a local socket
+class TestSequenceService(unittest.TestCase):
+    def test_service(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            log = tmp + "/CT.log"
+            shutil.copy("examples/logs/CT_eye_segmentation.log", log)
+            service = iSBatchService.SequenceService(tmp + "/service.sock",
+                                                     refresh_interval=60)
+            service.register("CT", log, params={
+                "CR_strategy": "AlwaysCheckpoint"})
+            service.start()
+            try:
+                address = tmp + "/service.sock"
+                expected = rqs.ResourceParameters()
+                expected.CR_strategy = rqs.CRStrategy.AlwaysCheckpoint
+                wl = rqs.ResourceEstimator(np.loadtxt(log), params=expected)
+                sequence = [[float(i[0]), i[1]]
+                            for i in wl.compute_request_sequence()]
+                response = iSBatchService.request_sequence(address, "CT")
+                self.assertEqual(response["sequence"], sequence)
+                self.assertFalse(response["cached"])
+                self.assertTrue(iSBatchService.request_sequence(
+                    address, "CT")["cached"])
+                # concurrent identical requests are computed once
+                responses = []
+                threads = [threading.Thread(
+                    target=lambda: responses.append(
+                        iSBatchService.request_sequence(
+                            address, "CT", cost=[1, 0, 0], timeout=10)))
+                           for i in range(8)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                self.assertEqual(len(responses), 8)
+                self.assertEqual(service.stats["computed"], 2)
+                self.assertIn("error", iSBatchService.request_sequence(
+                    address, "unknown"))
+                # a modified history is reloaded
+                with open(log, "a") as fp:
+                    fp.write("200000\n")
+                service.refresh()
+                response = iSBatchService.request_sequence(address, "CT")
+                # all requests checkpoint, the last one covers the new run
+                self.assertAlmostEqual(
+                    sum(i[0] for i in response["sequence"]), 200000)
+                self.assertEqual(service.stats["refreshed"], 1)
+            finally:
+                service.stop()
+
+    def test_slow_application(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            log = tmp + "/CT.log"
+            shutil.copy("examples/logs/CT_eye_segmentation.log", log)
+            service = iSBatchService.SequenceService(tmp + "/service.sock")
+            service.register("slow", log)
+            service.register("fast", log)
+            service.get_sequence("fast")
+            started = threading.Event()
+            release = threading.Event()
+            compute = service.applications["slow"].compute
+
+            def slow_compute(estimator, key):
+                started.set()
+                release.wait(30)
+                return compute(estimator, key)
+
+            service.applications["slow"].compute = slow_compute
+            slow = [threading.Thread(target=service.get_sequence,
+                                     args=("slow", cost))
+                    for cost in [None, [1, 0, 0]]]
+            slow[0].start()
+            try:
+                self.assertTrue(started.wait(30))
+                # a second request of the slow application waits for it
+                slow[1].start()
+                slow[1].join(0.5)
+                # the other application is served during the computation
+                responses = []
+                fast = threading.Thread(target=lambda: responses.extend([
+                    service.get_sequence("fast"),
+                    service.get_sequence("fast", cost=[1, 0, 0])]))
+                fast.start()
+                fast.join(30)
+                self.assertFalse(fast.is_alive())
+                self.assertEqual([i["cached"] for i in responses],
+                                 [True, False])
+                self.assertTrue(all(i.is_alive() for i in slow))
+            finally:
+                release.set()
+                for thread in slow:
+                    if thread.ident is not None:
+                        thread.join()
+            self.assertEqual(service.stats["computed"], 4)
+
 
 # test the cost model
 class TestCostModel(unittest.TestCase):
+    def test_checkpoint_memory_vectors(self):
+        model = rqs.DynamicCheckpointMemoryModel([(0, 2), (10, 4), (20, 1)],
+                                                 write_bandwidth=2)
+        ts = np.array([0, 5, 10, 15, 20, 100])
+        self.assertEqual(model.get_checkpoint_times(ts).tolist(),
+                         [4, 4, 8, 8, 2, 2])
+        self.assertEqual(model.get_restart_times(ts).tolist(),
+                         [model.get_restart_time(t) for t in ts])
+        cost = rqs.ClusterCosts(checkpoint_memory_model=
+                                rqs.StaticCheckpointMemoryModel(3, 5))
+        self.assertEqual(cost.get_checkpoint_times(ts).tolist(), [3] * 6)
+        self.assertEqual(cost.get_restart_times(ts).tolist(), [5] * 6)
+
+    def test_scalar_checkpoint_model(self):
+        # user models may only define the scalar methods
+        class ScalarModel():
+            def get_checkpoint_time(self, ts):
+                return 2 if ts < 20 else 4
+
+            def get_restart_time(self, ts):
+                return 1 if ts < 20 else 3
+
+        dynamic = rqs.DynamicCheckpointMemoryModel([(0, 2), (20, 4)])
+        dynamic.get_restart_time = lambda ts: 1 if ts < 20 else 3
+        dynamic.get_restart_times = lambda ts: np.where(
+            np.asarray(ts) < 20, 1, 3)
+        data = list(np.arange(1., 41.))
+        cdf = list(np.arange(1, 41) / 40)
+        for sequence_type, params in [
+                (rqs.CheckpointSequence, [0]),
+                (rqs.LimitedSequence, [rqs.CRStrategy.AdaptiveCheckpoint,
+                                       rqs.LimitStrategy.ThresholdBased, 3,
+                                       0])]:
+            sequences = [sequence_type(
+                data, cdf, rqs.ClusterCosts(checkpoint_memory_model=model),
+                params=params).compute_request_sequence()
+                for model in [ScalarModel(), dynamic]]
+            self.assertEqual(sequences[0], sequences[1])
+
+    def test_memory_trace_builder(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            np.savetxt(tmp + "/run1.mem",
+                       [[0, 10], [2, 11], [4, 50], [6, 52], [8, 5]],
+                       delimiter=',', fmt='%d')
+            np.save(tmp + "/run2.npy", np.array([[0, 12], [2, 9], [4, 49]]))
+            builder = rqs.MemoryTraceBuilder(threshold=5, scale=1,
+                                             chunk_size=2)
+            builder.add_file(tmp + "/run1.mem")
+            builder.add_file(tmp + "/run2.npy")
+        self.assertEqual(builder.get_envelope()[:, 1].tolist(),
+                         [12, 11, 50, 52, 5])
+        self.assertEqual(builder.get_segments(),
+                         [(0, 11.5), (4, 51), (8, 5)])
+        model = builder.build(write_bandwidth=2)
+        self.assertEqual(model.get_checkpoint_time(5), 102)
+
     def test_cost_with_checkpoint(self):
         sequence = [(4, 1), (6, 0)]
         handler = rqs.LogDataCost(sequence)
@@ -341,6 +1018,21 @@ class TestCostModel(unittest.TestCase):
         self.assertEqual(handler.compute_cost([3], cost), 8)
         self.assertEqual(handler.compute_cost([7], cost), 27)
 
+    def test_cost_matrix(self):
+        sequences = [[(4, 1), (6, 0)], [4, 10], [(2, 0), (5, 1), (9, 0)]]
+        cost, submissions = rqs.LogDataCost.compute_cost_matrix(
+            sequences, [3, 7, 20], rqs.ClusterCosts(1, 1, 0))
+        self.assertEqual(cost.shape, (3, 3))
+        self.assertEqual(list(cost[0]), [7, 17, 20])
+        self.assertEqual(list(cost[1]), [7, 25, 28])
+        self.assertEqual(list(cost[2]), [12, 25, 32])
+        self.assertEqual(list(submissions[0]), [1, 2, 2])
+        self.assertEqual(list(submissions[2]), [2, 3, 3])
+        for i in range(len(sequences)):
+            self.assertAlmostEqual(
+                np.mean(cost[i]), rqs.LogDataCost(sequences[i]).compute_cost(
+                    [3, 7, 20], rqs.ClusterCosts(1, 1, 0)))
+
     @ignore_warnings
     def test_sequence_cost(self):
         wl = rqs.ResourceEstimator([5]*101)
@@ -369,5 +1061,48 @@ class TestCostModel(unittest.TestCase):
         cost = wl.compute_sequence_cost(sequence, data)
         self.assertTrue(cost >= cost_opt) 
 
+
+# test the synthetic workload generator
+class TestWorkloadGenerator(unittest.TestCase):
+    def test_runtimes(self):
+        runtimes = iSBatchWorkload.WorkloadGenerator(seed=3).get_runtimes(
+            10000, "bimodal", resolution=60, limit=18000)
+        self.assertEqual(runtimes.tolist(), iSBatchWorkload.WorkloadGenerator(
+            seed=3).get_runtimes(10000, "bimodal", resolution=60,
+                                 limit=18000).tolist())
+        self.assertTrue(all(runtimes % 60 == 0) and runtimes.max() <= 18000)
+        # about 60% of the runs in the first mode
+        self.assertAlmostEqual(np.mean(runtimes < 9000), 0.6, delta=0.02)
+        with tempfile.TemporaryDirectory() as tmp:
+            iSBatchWorkload.write_runtimes(tmp + "/runs.log", runtimes,
+                                           chunk_size=999)
+            self.assertEqual(iSBatchLoader.load_log(
+                tmp + "/runs.log").tolist(), runtimes.tolist())
+            iSBatchWorkload.write_accounting_log(
+                tmp + "/sacct.csv", {("alice", "ct", 1): runtimes[:20],
+                                     ("bob", "ct", 2): [90061]})
+            keys, elapsed = iSBatchLoader.AccountingLogIngestion().read(
+                tmp + "/sacct.csv")
+        self.assertEqual(elapsed.tolist(), runtimes[:20].tolist() + [90061])
+
+    def test_memory_traces(self):
+        generator = iSBatchWorkload.WorkloadGenerator(seed=3)
+        traces = generator.get_memory_traces([1000, 2000])
+        self.assertEqual([len(trace) for trace in traces], [500, 1000])
+        builder = rqs.MemoryTraceBuilder()
+        with tempfile.TemporaryDirectory() as tmp:
+            for i, trace in enumerate(traces):
+                iSBatchWorkload.write_memory_trace(
+                    "%s/run%d.mem" % (tmp, i), trace)
+                builder.add_file("%s/run%d.mem" % (tmp, i))
+        # one segment per memory phase, the envelope takes the earliest
+        # phase changes (shorter run) and the end of the longest run
+        segments = builder.get_segments()
+        self.assertEqual([ts for ts, size in segments], [0, 50, 200, 1800])
+        self.assertAlmostEqual(segments[2][1], 9.8e6 / 1024, delta=50)
+        model = builder.build()
+        self.assertEqual(model.get_checkpoint_time(500), segments[2][1])
+
+
 if __name__ == '__main__':
     unittest.main()